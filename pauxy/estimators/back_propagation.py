@@ -9,6 +9,7 @@ from pauxy.estimators.utils import H5EstimatorHelper
 from pauxy.estimators.mixed import gab, local_energy
 import pauxy.propagation.generic
 import pauxy.propagation.hubbard
+from pauxy.walkers.single_det import initial_wavefunction
 
 class BackPropagation(object):
     """Class for computing back propagated estimates.
@@ -52,6 +53,9 @@ class BackPropagation(object):
         Class for outputting data to HDF5 group.
     rdm_output : :class:`pauxy.estimators.H5EstimatorHelper`
         Class for outputting rdm data to HDF5 group.
+    psi_init : :class:`numpy.ndarray`
+        Wavefunction each walker's back propagated wavefunction is reset to
+        before back propagation.
     """
 
     def __init__(self, bp, root, h5f, qmc, system, trial, dtype, BT2):
@@ -92,6 +96,8 @@ class BackPropagation(object):
             self.back_propagate = pauxy.propagation.hubbard.back_propagate_ghf
         else:
             self.update = self.update_uhf
+            self.psi_init = numpy.array(initial_wavefunction(system, trial),
+                                        dtype=trial.psi.dtype)
             if system.name == "Generic":
                 self.back_propagate = pauxy.propagation.generic.back_propagate
             else:
@@ -117,13 +123,13 @@ class BackPropagation(object):
         """
         if step % self.nmax != 0:
             return
-        psi_bp = self.back_propagate(system, psi.walkers, trial,
-                                     self.nstblz, self.BT2, qmc.dt)
+        numpy.copyto(psi.stack.phi_bp, self.psi_init)
+        self.back_propagate(system, psi, trial, self.nstblz, self.BT2, qmc.dt)
         nup = system.nup
         denominator = 0
-        for i, (wnm, wb) in enumerate(zip(psi.walkers, psi_bp)):
-            self.G[0] = gab(wb.phi[:,:nup], wnm.phi_old[:,:nup]).T
-            self.G[1] = gab(wb.phi[:,nup:], wnm.phi_old[:,nup:]).T
+        for i, wnm in enumerate(psi.walkers):
+            self.G[0] = gab(wnm.phi_bp[:,:nup], wnm.phi_old[:,:nup]).T
+            self.G[1] = gab(wnm.phi_bp[:,nup:], wnm.phi_old[:,nup:]).T
             energies = numpy.array(list(local_energy(system, self.G)))
             if self.restore_weights is not None:
                 weight = wnm.weight * self.calculate_weight_factor(wnm)
@@ -136,7 +142,6 @@ class BackPropagation(object):
             )
         self.estimates[0] += denominator
         psi.copy_historic_wfn()
-        psi.copy_bp_wfn(psi_bp)
 
     def update_ghf(self, system, qmc, trial, psi, step, free_projection=False):
         """Calculate back-propagated estimates for GHF walkers.
@@ -158,7 +163,7 @@ class BackPropagation(object):
         """
         if step % self.nmax != 0:
             return
-        psi_bp = self.back_propagate(system, psi.walkers, trial,
+        psi_bp = self.back_propagate(system, psi, trial,
                                      self.nstblz, self.BT2,
                                      self.dt)
         denominator = sum(wnm.weight for wnm in psi.walkers)
@@ -218,9 +223,9 @@ class BackPropagation(object):
         if step != 0 and step % self.nmax == 0:
             comm.Reduce(self.estimates, self.global_estimates, op=mpi_sum)
             if comm.Get_rank() == 0:
-                self.output.push(self.global_estimates[:self.nreg]/(nprocs))
+                self.output.push(self.global_estimates[:self.nreg])
                 if self.rdm:
-                    rdm = self.global_estimates[self.nreg:].reshape(self.G.shape)/(nprocs)
+                    rdm = self.global_estimates[self.nreg:].reshape(self.G.shape)
                     self.dm_output.push(rdm)
             self.zero()
 
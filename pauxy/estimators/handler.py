@@ -12,6 +12,7 @@ import warnings
 from pauxy.estimators.back_propagation import BackPropagation
 from pauxy.estimators.mixed import Mixed
 from pauxy.estimators.itcf import ITCF
+from pauxy.utils.io import write_distributed_dataset
 
 
 class Estimators(object):
@@ -132,3 +133,82 @@ class Estimators(object):
         """
         for k, e in self.estimators.items():
             e.update(system, qmc, trial, psi, step, free_projection)
+
+    def accumulators(self):
+        """Estimator arrays accumulated on each processor between output.
+
+        Returns
+        -------
+        accumulators : dict
+            Accumulated array for each estimator.
+        """
+        accumulators = {}
+        for (k, e) in self.estimators.items():
+            accumulators[k] = e.spgf if k == 'itcf' else e.estimates
+        return accumulators
+
+    def outputs(self):
+        """Output datasets of estimators. Only defined on root processor.
+
+        Returns
+        -------
+        outputs : dict
+            :class:`pauxy.estimators.utils.H5EstimatorHelper` objects for
+            each estimator's output.
+        """
+        outputs = {}
+        for (k, e) in self.estimators.items():
+            for name in ['output', 'dm_output', 'rspace_unit', 'kspace_unit']:
+                if hasattr(e, name):
+                    outputs['%s_%s'%(k, name)] = getattr(e, name)
+        return outputs
+
+    def write_checkpoint(self, comm, h5f):
+        """Write estimator accumulators to checkpoint file.
+
+        Parameters
+        ----------
+        comm : MPI communicator
+        h5f : :class:`h5py.File` or None
+            Checkpoint file opened with
+            :func:`pauxy.utils.io.open_distributed_file`.
+        """
+        for (k, v) in sorted(self.accumulators().items()):
+            write_distributed_dataset(comm, h5f,
+                                      'estimators/accumulators/%s'%k, v)
+
+    def write_outputs_checkpoint(self, h5f):
+        """Copy output written so far to checkpoint file.
+
+        A restarted calculation can then produce a complete output file. Only
+        called on the root processor.
+
+        Parameters
+        ----------
+        h5f : :class:`h5py.File`
+            Checkpoint file.
+        """
+        for (k, v) in self.outputs().items():
+            dset = h5f.create_dataset('estimators/outputs/%s'%k,
+                                      data=v.store[:v.index])
+            dset.attrs['index'] = v.index
+
+    def read_checkpoint(self, comm, h5f):
+        """Read estimator state from checkpoint file.
+
+        Parameters
+        ----------
+        comm : MPI communicator
+        h5f : :class:`h5py.File`
+            Checkpoint file.
+        """
+        for (k, v) in self.accumulators().items():
+            numpy.copyto(v, h5f['estimators/accumulators/%s'%k][comm.rank])
+        mixed = self.estimators['mixed']
+        mixed.estimates[mixed.names.time] = time.time()
+        if comm.rank == 0:
+            for (k, v) in self.outputs().items():
+                dset = h5f['estimators/outputs/%s'%k]
+                v.index = dset.attrs['index']
+                if v.index > 0:
+                    v.store[:v.index] = dset[...]
@@ -63,6 +63,8 @@ class ITCF(object):
         Storage for single-particle greens function (SPGF).
     spgf_global : :class:`numpy.ndarray`
         Store for ITCF accross all processors.
+    denom : :class:`numpy.ndarray`
+        Total walker weight for current estimate of spgf.
     rspace_unit : :class:`pauxy.estimators.H5EstimatorHelper`
         Output dataset for real space itcfs.
     kspace_unit : :class:`pauxy.estimators.H5EstimatorHelper`
@@ -86,6 +88,10 @@ class ITCF(object):
                                 dtype=trial.G.dtype)
         self.spgf_global = numpy.zeros(shape=self.spgf.shape,
                                        dtype=trial.G.dtype)
+        # spgf is normalised by the total weight across all processors on
+        # output.
+        self.denom = numpy.zeros(1)
+        self.denom_global = numpy.zeros(1)
         if trial.type == "GHF":
             self.I = numpy.identity(trial.psi.shape[1], dtype=trial.psi.dtype)
             self.initial_greens_function = self.initial_greens_function_ghf
@@ -165,7 +171,7 @@ class ITCF(object):
         """
 
         nup = system.nup
-        denom = sum(w.weight for w in psi.walkers)
+        self.denom[0] = sum(w.weight for w in psi.walkers)
         M = system.nbasis
         for ix, w in enumerate(psi.walkers):
             # 1. Construct psi_left for first step in algorithm by back
@@ -189,7 +195,6 @@ class ITCF(object):
                 B = self.construct_propagator_matrix(system, self.BT2, c)
                 (Ggr, Gls) = self.increment_tau(Ggr, Gls, B)
                 self.accumulate(ic+1, w.weight, Ggr, Gls, M)
-        self.spgf = self.spgf / denom
         # copy current walker distribution to initial (right hand) wavefunction
         # for next estimate of ITCF
         psi.copy_init_wfn()
@@ -213,7 +218,7 @@ class ITCF(object):
         """
 
         nup = system.nup
-        denom = sum(w.weight for w in psi.walkers)
+        self.denom[0] = sum(w.weight for w in psi.walkers)
         M = system.nbasis
         for ix, w in enumerate(psi.walkers):
             Ggr = numpy.identity(self.I.shape[0], dtype=self.I.dtype)
@@ -260,7 +265,6 @@ class ITCF(object):
                 (Ggr_nn, Gls_nn) = self.initial_greens_function(L, w.phi_init,
                                                                 trial, nup,
                                                                 w.weights)
-        self.spgf = self.spgf / denom
         # copy current walker distribution to initial (right hand) wavefunction
         # for next estimate of ITCF
         psi.copy_init_wfn()
@@ -500,8 +504,10 @@ class ITCF(object):
         """
         if step != 0 and step % self.nprop_tot == 0:
             comm.Reduce(self.spgf, self.spgf_global, op=mpi_sum)
+            comm.Reduce(self.denom, self.denom_global, op=mpi_sum)
             if comm.Get_rank() == 0:
-                self.to_file(self.rspace_unit, self.spgf_global/nprocs)
+                self.spgf_global /= self.denom_global[0]
+                self.to_file(self.rspace_unit, self.spgf_global)
                 if self.kspace:
                     M = self.spgf.shape[-1]
                     # FFT the real space Green's function.
@@ -510,9 +516,9 @@ class ITCF(object):
                     # spgf, self.P.conj().T) / M
                     spgf_k = numpy.fft.fft2(self.spgf_global)
                     if self.spgf.dtype == complex:
-                        self.to_file(self.kspace_unit, spgf_k/nprocs)
+                        self.to_file(self.kspace_unit, spgf_k)
                     else:
-                        self.to_file(self.kspace_unit, spgf_k.real/nprocs)
+                        self.to_file(self.kspace_unit, spgf_k.real)
             self.zero()
 
     def to_file(self, group, spgf):
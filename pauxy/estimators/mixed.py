@@ -153,18 +153,19 @@ class Mixed(object):
         """
         es = self.estimates
         ns = self.names
-        denom = es[ns.edenom]*nprocs / nmeasure
-        es[ns.eproj] = es[ns.enumer] / denom
-        es[ns.ekin:ns.epot+1] /= denom
-        es[ns.weight:ns.enumer] = es[ns.weight:ns.enumer]
         es[ns.time] = (time.time()-es[ns.time]) / nprocs
         comm.Reduce(es, self.global_estimates, op=mpi_sum)
         if comm.Get_rank() == 0:
+            # Ratios are formed from the estimates summed over processors.
+            gs = self.global_estimates
+            denom = gs[ns.edenom] / nmeasure
+            gs[ns.eproj] = gs[ns.enumer] / denom
+            gs[ns.ekin:ns.epot+1] /= denom
             print (format_fixed_width_floats([step]+
-                   list(self.global_estimates[:ns.time+1].real/nmeasure)))
-            self.output.push(self.global_estimates[:ns.time+1]/nmeasure)
+                   list(gs[:ns.time+1].real/nmeasure)))
+            self.output.push(gs[:ns.time+1]/nmeasure)
             if self.rdm:
-                rdm = self.global_estimates[self.nreg:].reshape(self.G.shape)
+                rdm = gs[self.nreg:].reshape(self.G.shape)
                 self.dm_output.push(rdm/denom/nmeasure)
         self.zero()
 
@@ -210,9 +211,15 @@ class Mixed(object):
             s = s.encode('utf-8')
         print(s)
 
-    def projected_energy(self):
+    def projected_energy(self, comm=None):
         """Computes projected energy from estimator array.
 
+        Parameters
+        ----------
+        comm : MPI communicator, optional
+            If not None the numerator and denominator are summed over
+            processors so that every processor obtains the same estimate.
+
         Returns
         -------
         eproj : float
@@ -220,6 +227,11 @@ class Mixed(object):
         """
         numerator = self.estimates[self.names.enumer]
         denominator = self.estimates[self.names.edenom]
+        if comm is not None:
+            local = numpy.array([numerator, denominator])
+            proc = numpy.zeros(shape=(comm.size, 2), dtype=local.dtype)
+            comm.Allgather(local, proc)
+            (numerator, denominator) = numpy.sum(proc, axis=0)
         return (numerator / denominator).real
 
     def zero(self):
@@ -0,0 +1,219 @@
+"""Checkerboard decomposition of one-body propagators for lattice models."""
+import copy
+import numpy
+import scipy.sparse
+# Sparse-dense product accumulated into an existing array. The public
+# interface allocates a new array for each product.
+from scipy.sparse._sparsetools import csr_matvecs
+
+
+class Checkerboard(object):
+    r"""Checkerboard (bond decomposed) approximation to :math:`e^{-\Delta\tau T}`.
+
+    The off-diagonal elements of the one-body operator are split into groups
+    of bonds which share no sites, so that the exponential of each group is a
+    product of independent 2x2 bond exponentials. The propagator is
+    approximated by the symmetric product
+
+    .. math::
+        e^{-\Delta\tau T} \approx e^{-\Delta\tau K_1/2}\cdots
+            e^{-\Delta\tau K_n/2} e^{-\Delta\tau D} e^{-\Delta\tau K_n/2}
+            \cdots e^{-\Delta\tau K_1/2},
+
+    where :math:`K_c` are the bond groups and :math:`D` is the diagonal part
+    of :math:`T`, which is correct to second order in :math:`\Delta\tau`.
+    Applying the propagator then costs :math:`O(N N_e)` rather than
+    :math:`O(N^2 N_e)` for sparse :math:`T`, e.g., nearest neighbour hopping
+    with periodic, twisted or open boundary conditions and pinning fields.
+    Each factor is stored as a sparse matrix with at most two non-zero
+    elements per row. For a stack of walkers each factor is applied once to
+    the orbitals of the whole population.
+
+    Parameters
+    ----------
+    T : :class:`numpy.ndarray`
+        One-body operator for each spin. Shape (2, nbasis, nbasis).
+    dt : float
+        Timestep.
+
+    Attributes
+    ----------
+    ops : list
+        Sequence of sparse factors for each spin, in the order in which they
+        are applied.
+    """
+
+    def __init__(self, T, dt):
+        self.nbasis = T.shape[-1]
+        self.dtype = T.dtype
+        self.ops = [self.decompose(Ts, dt) for Ts in T]
+        # Work array for the orbitals of a stack of walkers, grown as
+        # required.
+        self.work = numpy.empty(0, dtype=self.dtype)
+
+    def decompose(self, T, dt):
+        """Construct sequence of bond and diagonal exponentials.
+
+        Parameters
+        ----------
+        T : :class:`numpy.ndarray`
+            One-body operator for a single spin.
+        dt : float
+            Timestep.
+
+        Returns
+        -------
+        ops : list
+            Sequence of sparse factors making up the propagator.
+        """
+        (i, j) = numpy.nonzero(numpy.triu(T, 1))
+        # Greedily assign bonds to groups with no shared sites.
+        colour = numpy.zeros(len(i), dtype=int)
+        used = []
+        for (b, (p, q)) in enumerate(zip(i, j)):
+            c = 0
+            while c < len(used) and (p in used[c] or q in used[c]):
+                c += 1
+            if c == len(used):
+                used.append(set())
+            used[c].update((p, q))
+            colour[b] = c
+        half = [self.bond_exponential(i[colour==c], j[colour==c],
+                                      T[i[colour==c],j[colour==c]], 0.5*dt)
+                for c in range(len(used))]
+        diag = T.diagonal()
+        if numpy.any(diag != 0):
+            centre = [scipy.sparse.diags(numpy.exp(-dt*diag), format='csr')]
+            return half + centre + half[::-1]
+        elif len(half) > 0:
+            # Combine the two central half steps.
+            c = len(used) - 1
+            centre = [self.bond_exponential(i[colour==c], j[colour==c],
+                                            T[i[colour==c],j[colour==c]], dt)]
+            return half[:-1] + centre + half[-2::-1]
+        else:
+            return []
+
+    def bond_exponential(self, i, j, tij, dt):
+        r"""Exponential of a group of independent bonds.
+
+        For a single bond :math:`h = ((0, t_{ij}), (t_{ij}^*, 0))` we have
+        :math:`e^{-\Delta\tau h} = \cosh(\Delta\tau|t_{ij}|) -
+        \sinh(\Delta\tau|t_{ij}|) h / |t_{ij}|`.
+
+        Parameters
+        ----------
+        i : :class:`numpy.ndarray`
+            First site of each bond.
+        j : :class:`numpy.ndarray`
+            Second site of each bond.
+        tij : :class:`numpy.ndarray`
+            Matrix elements :math:`T_{ij}`.
+        dt : float
+            Timestep.
+
+        Returns
+        -------
+        op : :class:`scipy.sparse.csr_matrix`
+            Product of bond exponentials. Sites not in any bond are
+            unchanged.
+        """
+        r = abs(tij)
+        s = -numpy.sinh(dt*r) / r
+        sites = numpy.arange(self.nbasis)
+        diag = numpy.ones(self.nbasis, dtype=self.dtype)
+        diag[i] = diag[j] = numpy.cosh(dt*r)
+        rows = numpy.concatenate([sites, i, j])
+        cols = numpy.concatenate([sites, j, i])
+        vals = numpy.concatenate([diag, s*tij, s*tij.conj()])
+        return scipy.sparse.csr_matrix((vals, (rows, cols)),
+                                       shape=(self.nbasis, self.nbasis))
+
+    def apply(self, phi, s):
+        """Apply propagator to wavefunction inplace.
+
+        Parameters
+        ----------
+        phi : :class:`numpy.ndarray`
+            Orbitals of spin s. Shape (nbasis, nspin) or (nwalkers, nbasis,
+            nspin) for a stack of walkers.
+        s : int
+            Spin index.
+        """
+        if phi.ndim == 3:
+            # View the stack as a single (nbasis, nwalkers*nspin) matrix and
+            # alternate between two halves of the work array.
+            (nwalkers, nbasis, nspin) = phi.shape
+            ncols = nwalkers * nspin
+            size = 2 * nbasis * ncols
+            if self.work.size < size or self.work.dtype != phi.dtype:
+                self.work = numpy.empty(size, dtype=phi.dtype)
+            (x, y) = self.work[:size].reshape(2, nbasis, ncols)
+            numpy.copyto(x.reshape(nbasis, nwalkers, nspin),
+                         phi.transpose(1,0,2))
+            for op in self.ops[s]:
+                y.fill(0)
+                csr_matvecs(nbasis, nbasis, ncols, op.indptr, op.indices,
+                            op.data.astype(phi.dtype, copy=False), x.ravel(),
+                            y.ravel())
+                (x, y) = (y, x)
+            numpy.copyto(phi.transpose(1,0,2),
+                         x.reshape(nbasis, nwalkers, nspin))
+        else:
+            psi = phi
+            for op in self.ops[s]:
+                psi = op.dot(psi)
+            phi[:] = psi
+
+    def squared(self):
+        """Checkerboard approximation to the square of the propagator.
+
+        The last factor of the first propagator and the first factor of the
+        second are combined into a single factor.
+
+        Returns
+        -------
+        squared : :class:`Checkerboard`
+            Propagator for twice the timestep.
+        """
+        squared = copy.copy(self)
+        squared.ops = []
+        for ops in self.ops:
+            if len(ops) > 0:
+                ops = ops[:-1] + [ops[0].dot(ops[-1])] + ops[1:]
+            squared.ops.append(ops)
+        return squared
+
+    def matrix(self):
+        """Dense representation of the propagator.
+
+        Returns
+        -------
+        B : :class:`numpy.ndarray`
+            Propagator matrix for each spin.
+        """
+        B = numpy.array([numpy.identity(self.nbasis, dtype=self.dtype)
+                         for s in range(2)])
+        for s in range(2):
+            self.apply(B[s], s)
+        return B
+
+
+def kinetic_checkerboard(phi, system, checkerboard):
+    r"""Propagate by the kinetic term using the checkerboard decomposition.
+
+    Acts on either a single walker's wavefunction or a stack of walkers.
+
+    Parameters
+    ----------
+    phi : :class:`numpy.ndarray`
+        Walker's wavefunction of shape (nbasis, ne), or walkers' wavefunctions
+        of shape (nwalkers, nbasis, ne). Updated inplace.
+    system : system object in general.
+        Container for model input options.
+    checkerboard : :class:`Checkerboard`
+        Decomposed propagator.
+    """
+    nup = system.nup
+    checkerboard.apply(phi[...,:nup], 0)
+    checkerboard.apply(phi[...,nup:], 1)
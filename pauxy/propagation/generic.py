@@ -2,9 +2,9 @@ import cmath
 import math
 import numpy
 import scipy.linalg
-from pauxy.propagation.operations import kinetic_real
-from pauxy.utils.linalg import exponentiate_matrix
-from pauxy.walkers.single_det import SingleDetWalker
+from pauxy.propagation.operations import (kinetic_real, kinetic_real_batched,
+                                         half_step_trial)
+from pauxy.utils.linalg import exponentiate_matrix, reortho_batched
 
 class GenericContinuous(object):
     """Propagator for generic many-electron Hamiltonian.
@@ -46,21 +46,29 @@ class GenericContinuous(object):
         self.mf_const_fac = cmath.exp(-self.dt*mf_core)
         self.BT_BP = self.BH1
         self.nstblz = qmc.nstblz
+        # Defer the trailing one-body half step to the next step.
+        self.leapfrog = (options.get('leapfrog', False) and
+                         not self.free_projection)
+        self.deferred = False
+        if self.leapfrog:
+            self.BH1_full = numpy.array([b.dot(b) for b in self.BH1])
+            self.psi_half_H = half_step_trial(trial.psi_H, self.BH1)
         # Temporary array for matrix exponentiation.
         self.Temp = numpy.zeros(trial.psi[:,:system.nup].shape,
                                 dtype=trial.psi.dtype)
         # Half rotated cholesky vectors (by trial wavefunction).
         # Assuming nup = ndown here
-        rotated_up = numpy.einsum('rp,lpq->lrq',
-                                  trial.psi[:,:system.nup].conj().T,
+        rotated_up = numpy.einsum('rp,lpq->lrq', trial.psi_H[0],
                                   system.chol_vecs)
-        rotated_down = numpy.einsum('rp,lpq->lrq',
-                                    trial.psi[:,system.nup:].conj().T,
+        rotated_down = numpy.einsum('rp,lpq->lrq', trial.psi_H[1],
                                     system.chol_vecs)
         self.rchol_vecs = numpy.array([rotated_up, rotated_down])
         self.chol_vecs = system.chol_vecs
         self.ebound = (2.0/self.dt)**0.5
         self.mean_local_energy = 0
+        # Random numbers required per walker per step.
+        self.nuniform = 0
+        self.nnormal = system.nchol_vec
         if self.free_projection:
             self.propagate_walker = self.propagate_walker_free
         else:
@@ -137,10 +145,10 @@ class GenericContinuous(object):
             Trial wavefunction object.
         """
         # Construct walker's modified Green's function (without Psi_T).
-        walker.inverse_overlap(trial.psi)
+        walker.inverse_overlap(trial.psi_H)
         walker.rotated_greens_function()
         # Normally distrubted auxiliary fields.
-        xi = numpy.random.normal(0.0, 1.0, system.nchol_vec)
+        xi = walker.normal
         # Optimal force bias.
         xbar = self.construct_force_bias(walker.Gmod)
         # Shifted auxiliary fields.
@@ -213,7 +221,7 @@ class GenericContinuous(object):
         # walker.phi[:,nup:] = bv.dot(walker.phi[:,nup:])
         # # 3. Apply kinetic projector.
         # kinetic_real(walker.phi, system, self.bt2)
-        # walker.inverse_overlap(trial.psi)
+        # walker.inverse_overlap(trial.psi_H)
         # walker.ot = walker.calc_otrial(trial.psi)
         # walker.greens_function(trial)
         # # Constant terms are included in the walker's weight.
@@ -242,18 +250,89 @@ class GenericContinuous(object):
         (cmf, cfb, xmxbar) = self.two_body(walker, system, trial)
         # 3. Apply one_body propagator.
         kinetic_real(walker.phi, system, self.BH1)
+        self.update_weight_phaseless(walker, system, trial,
+                                     (cmf, cfb, xmxbar))
 
-        # Now apply hybrid phaseless approximation
-        walker.inverse_overlap(trial.psi)
-        ot_new = walker.calc_otrial(trial.psi)
+    def update_weight_phaseless(self, walker, system, trial, factors,
+                                deferred=False):
+        r"""Apply hybrid phaseless approximation to walker.
+
+        Parameters
+        ----------
+        walker : :class:`walker.Walker`
+            Propagated walker. Updates inplace.
+        system : :class:`pauxy.system.System`
+            System object.
+        trial : :class:`pauxy.trial_wavefunctioin.Trial`
+            Trial wavefunction object.
+        factors : tuple
+            Constant factors and shifted fields returned by :meth:`two_body`.
+        deferred : bool
+            If true the trailing one-body half step has not been applied and
+            the overlap is computed with the trial wavefunction propagated by
+            half a step.
+        """
+        (cmf, cfb, xmxbar) = factors
+        if deferred:
+            (sign_new, log_new) = walker.inverse_overlap(self.psi_half_H)
+        else:
+            (sign_new, log_new) = walker.inverse_overlap(trial.psi_H)
         # Walker's phase.
-        importance_function = self.mf_const_fac*cmf*cfb*ot_new / walker.ot
+        importance_function = (self.mf_const_fac*cmf*cfb*sign_new /
+                               walker.ot_sign*math.exp(log_new-walker.log_ot))
         dtheta = cmath.phase(importance_function)
         cfac = max(0, math.cos(dtheta))
         rweight = abs(importance_function)
         walker.weight *= rweight * cfac
-        walker.ot = ot_new
-        walker.field_configs.push_full(xmxbar, cfac, importance_function/rweight)
+        (walker.ot_sign, walker.log_ot) = (sign_new, log_new)
+        if walker.field_configs is not None:
+            walker.field_configs.push_full(xmxbar, cfac,
+                                           importance_function/rweight)
+
+    def propagate_walkers(self, psi, system, trial, sync=True):
+        r"""Propagate all walkers using phaseless approximation.
+
+        Population version of :meth:`propagate_walker_phaseless` which
+        applies the one-body propagator to the stacked wavefunctions of all
+        walkers at once. The two-body propagator and weight update are applied
+        to each walker in turn.
+
+        With leapfrog the trailing one-body half step is deferred unless sync
+        is true and combined with the first half step of the next step. The
+        force bias is evaluated after the first half step as usual and the
+        importance function uses the overlap with the trial wavefunction
+        propagated by half a step, so the walkers' wavefunctions and relative
+        weights are the same as without leapfrog. The weights' overall
+        normalisation is not, as the trial energy is estimated from fewer
+        samples.
+
+        Parameters
+        ----------
+        psi : :class:`pauxy.walkers.Walkers`
+            Walkers to be propagated. Must use a
+            :class:`pauxy.walkers.stack.WalkerStack`.
+        system : :class:`pauxy.system.System`
+            System object.
+        trial : :class:`pauxy.trial_wavefunctioin.Trial`
+            Trial wavefunction object.
+        sync : bool
+            If false the trailing one-body half step may be deferred.
+        """
+        active = [w for w in psi.walkers if abs(w.weight) > 1e-8 and w.alive]
+        if self.free_projection:
+            for w in active:
+                self.propagate_walker(w, system, trial)
+            return
+        if self.deferred:
+            kinetic_real_batched(psi.stack.phi, system, self.BH1_full)
+        else:
+            kinetic_real_batched(psi.stack.phi, system, self.BH1)
+        factors = [self.two_body(w, system, trial) for w in active]
+        self.deferred = self.leapfrog and not sync
+        if not self.deferred:
+            kinetic_real_batched(psi.stack.phi, system, self.BH1)
+        for (w, f) in zip(active, factors):
+            self.update_weight_phaseless(w, system, trial, f, self.deferred)
 
 def construct_propagator_matrix_generic(system, BT2, config, dt, conjt=False):
     """Construct the full projector from a configuration of auxiliary fields.
@@ -290,14 +369,19 @@ def construct_propagator_matrix_generic(system, BT2, config, dt, conjt=False):
 def back_propagate(system, psi, trial, nstblz, BT2, dt):
     r"""Perform back propagation for RHF/UHF style wavefunction.
 
-    For use with generic system hamiltonian.
+    For use with generic system hamiltonian. All walkers are advanced through
+    each time slice together. The exponential of the auxiliary field operator
+    is applied to the stacked wavefunctions by the same Taylor expansion used
+    in :func:`construct_propagator_matrix_generic`, so the projectors are never
+    formed.
 
     Parameters
     ---------
     system : system object in general.
         Container for model input options.
     psi : :class:`pauxy.walkers.Walkers` object
-        CPMC wavefunction.
+        CPMC wavefunction. The walkers' back propagated wavefunctions,
+        psi.stack.phi_bp, are propagated inplace from their current values.
     trial : :class:`pauxy.trial_wavefunction.X' object
         Trial wavefunction class.
     nstblz : int
@@ -306,23 +390,22 @@ def back_propagate(system, psi, trial, nstblz, BT2, dt):
         One body propagator.
     dt : float
         Timestep.
-
-    Returns
-    -------
-    psi_bp : list of :class:`pauxy.walker.Walker` objects
-        Back propagated list of walkers.
     """
-    psi_bp = [SingleDetWalker(1,system,trial,w) for w in range(len(psi))]
     nup = system.nup
-    for (iw, w) in enumerate(psi):
-        # propagators should be applied in reverse order
-        for (i, c) in enumerate(w.field_configs.get_block()[0][::-1]):
-            # could make this system specific to reduce need for multiple
-            # routines.
-            B = construct_propagator_matrix_generic(system, BT2,
-                                                    c, dt, conjt=True)
-            psi_bp[iw].phi[:,:nup] = B[0].dot(psi_bp[iw].phi[:,:nup])
-            psi_bp[iw].phi[:,nup:] = B[1].dot(psi_bp[iw].phi[:,nup:])
-            if i != 0 and i % nstblz == 0:
-                psi_bp[iw].reortho(trial)
-    return psi_bp
+    phi = psi.stack.phi_bp
+    BT2H = numpy.array([b.conj().T for b in BT2])
+    configs = psi.field_configs.get_block(slice(None))[0]
+    # propagators should be applied in reverse order
+    for (i, c) in enumerate(configs[:,::-1].swapaxes(0, 1)):
+        # The Hermitian conjugate of exp(VHS) is exp(VHS^{dagger}).
+        VHS = 1j*dt**0.5*numpy.einsum('wl,lpq->wpq', c, system.chol_vecs)
+        VHS = VHS.conj().swapaxes(1, 2)
+        kinetic_real_batched(phi, system, BT2H)
+        T = phi.copy()
+        for n in range(1, 7):
+            T = numpy.matmul(VHS, T) / n
+            phi += T
+        kinetic_real_batched(phi, system, BT2H)
+        if i != 0 and i % nstblz == 0:
+            phi[:,:,:nup] = reortho_batched(phi[:,:,:nup])
+            phi[:,:,nup:] = reortho_batched(phi[:,:,nup:])
@@ -3,11 +3,12 @@ import copy
 import numpy
 import math
 import scipy.linalg
-from pauxy.propagation.operations import kinetic_real, local_energy_bound
-from pauxy.utils.fft import fft_wavefunction, ifft_wavefunction
-from pauxy.utils.linalg import reortho
+from pauxy.propagation.checkerboard import Checkerboard, kinetic_checkerboard
+from pauxy.propagation.kspace import momentum_space, kinetic_kspace
+from pauxy.propagation.operations import (kinetic_real, kinetic_real_batched,
+                                         half_step_trial, local_energy_bound)
+from pauxy.utils.linalg import reortho, reortho_batched, inverse_slogdet
 from pauxy.walkers.multi_ghf import MultiGHFWalker
-from pauxy.walkers.single_det import SingleDetWalker
 
 class Discrete(object):
     """Propagator for discrete HS transformation.
@@ -30,11 +31,19 @@ class Discrete(object):
 
         if verbose:
             print ("# Parsing discrete propagator input options.")
+        self.checkerboard = None
+        self.kspace = None
         if trial.type == 'GHF':
             self.bt2 = scipy.linalg.expm(-0.5*qmc.dt*system.T[0])
+        elif options.get('checkerboard', False):
+            self.checkerboard = Checkerboard(system.T, 0.5*qmc.dt)
+            self.bt2 = self.checkerboard.matrix()
         else:
             self.bt2 = numpy.array([scipy.linalg.expm(-0.5*qmc.dt*system.T[0]),
                                     scipy.linalg.expm(-0.5*qmc.dt*system.T[1])])
+            if qmc.ffts and trial.name != 'multi_determinant':
+                self.kspace = momentum_space(system, 0.5*qmc.dt,
+                                             qmc.fft_workers, verbose)
         if trial.type == 'GHF' and trial.bp_wfn is not None:
             self.BT_BP = scipy.linalg.block_diag(self.bt2, self.bt2)
             self.back_propagate = back_propagate_ghf
@@ -42,14 +51,19 @@ class Discrete(object):
             self.BT_BP = self.bt2
             self.back_propagate = back_propagate
         self.nstblz = qmc.nstblz
-        self.btk = numpy.exp(-0.5*qmc.dt*system.eks)
         self.hs_type = 'discrete'
+        self.ndelay = max(min(options.get('ndelay', 16), system.nbasis), 1)
         self.free_projection = options.get('free_projection', False)
         self.gamma = numpy.arccosh(numpy.exp(0.5*qmc.dt*system.U))
         self.auxf = numpy.array([[numpy.exp(self.gamma), numpy.exp(-self.gamma)],
                                 [numpy.exp(-self.gamma), numpy.exp(self.gamma)]])
         self.auxf = self.auxf * numpy.exp(-0.5*qmc.dt*system.U)
         self.delta = self.auxf - 1
+        # Scratch space for fields if they are not being stored.
+        self.fields = numpy.zeros(system.nbasis, dtype=numpy.int8)
+        # Random numbers required per walker per step.
+        self.nuniform = system.nbasis
+        self.nnormal = 0
         if self.free_projection:
             self.propagate_walker = self.propagate_walker_free
         else:
@@ -58,17 +72,42 @@ class Discrete(object):
             if trial.type == 'GHF':
                 self.calculate_overlap_ratio = calculate_overlap_ratio_multi_ghf
                 self.kinetic = kinetic_ghf
+                self.kinetic_propagator = self.bt2
                 self.update_greens_function = self.update_greens_function_ghf
             else:
                 self.calculate_overlap_ratio = calculate_overlap_ratio_multi_det
-                self.kinetic = kinetic_real
+                (self.kinetic, self.kinetic_batched,
+                 self.kinetic_propagator) = select_kinetic(None,
+                                                           self.checkerboard,
+                                                           self.bt2)
         else:
             self.calculate_overlap_ratio = calculate_overlap_ratio_single_det
             self.update_greens_function = self.update_greens_function_uhf
-            if qmc.ffts:
-                self.kinetic = kinetic_kspace
+            self.two_body = self.two_body_delayed
+            (self.kinetic, self.kinetic_batched,
+             self.kinetic_propagator) = select_kinetic(self.kspace,
+                                                       self.checkerboard,
+                                                       self.bt2)
+        # Vectorise the potential term over walkers, only implemented for
+        # single determinant walkers with the constraint.
+        self.batched = (options.get('batched', False) and
+                        trial.name != 'multi_determinant' and
+                        not self.free_projection)
+        # Defer the trailing kinetic half step to the next step, only
+        # implemented for single determinant walkers with the constraint.
+        self.leapfrog = (options.get('leapfrog', False) and
+                         trial.name != 'multi_determinant' and
+                         not self.free_projection)
+        self.deferred = False
+        if self.leapfrog:
+            if self.kspace is not None:
+                self.kinetic_propagator_full = self.kspace.squared()
+            elif self.checkerboard is not None:
+                self.kinetic_propagator_full = self.checkerboard.squared()
             else:
-                self.kinetic = kinetic_real
+                self.kinetic_propagator_full = numpy.array([b.dot(b) for b in
+                                                            self.bt2])
+            self.psi_half_H = half_step_trial(trial.psi_H, self.bt2)
         if verbose:
             print ("# Finished setting up propagator.")
 
@@ -86,11 +125,11 @@ class Discrete(object):
         nup : int
             Number of up electrons.
         """
-        vup = trial.psi.conj()[i,:nup]
+        vup = trial.psi_conj[i,:nup]
         uup = walker.phi[i,:nup]
         q = numpy.dot(walker.inv_ovlp[0], vup)
         walker.G[0][i,i] = numpy.dot(uup, q)
-        vdown = trial.psi.conj()[i,nup:]
+        vdown = trial.psi_conj[i,nup:]
         udown = walker.phi[i,nup:]
         q = numpy.dot(walker.inv_ovlp[1], vdown)
         walker.G[1][i,i] = numpy.dot(udown, q)
@@ -124,16 +163,25 @@ class Discrete(object):
         trial : :class:`pauxy.trial_wavefunctioin.Trial`
             Trial wavefunction object.
         """
-        self.kinetic(walker.phi, system, self.bt2)
-        # Update inverse overlap
-        walker.inverse_overlap(trial.psi)
+        self.kinetic(walker.phi, system, self.kinetic_propagator)
+        # Update inverse overlap. Single determinant walkers return the sign
+        # and log of their overlap, multi-determinant walkers store the
+        # overlap itself.
+        overlap = walker.inverse_overlap(trial.psi_H)
         # Update walker weight
-        ot_new = walker.calc_otrial(trial)
-        ratio = (ot_new/walker.ot)
+        if overlap is None:
+            ot_new = walker.calc_otrial(trial)
+            ratio = (ot_new/walker.ot)
+        else:
+            (sign_new, log_new) = overlap
+            ratio = (sign_new/walker.ot_sign) * math.exp(log_new-walker.log_ot)
         phase = cmath.phase(ratio)
         if abs(phase) < 0.5*math.pi:
             walker.weight = walker.weight * ratio.real
-            walker.ot = ot_new
+            if overlap is None:
+                walker.ot = ot_new
+            else:
+                (walker.ot_sign, walker.log_ot) = overlap
         else:
             walker.weight = 0.0
 
@@ -154,6 +202,10 @@ class Discrete(object):
         delta = self.delta
         nup = system.nup
         soffset = walker.phi.shape[0] - system.nbasis
+        if walker.field_configs is not None:
+            fields = walker.field_configs.next_configs
+        else:
+            fields = self.fields
         for i in range(0, system.nbasis):
             self.update_greens_function(walker, trial, i, nup)
             # Ratio of determinants for the two choices of auxilliary fields
@@ -161,7 +213,7 @@ class Discrete(object):
             # issues here with complex numbers?
             phaseless_ratio = numpy.maximum(probs.real, [0,0])
             norm = sum(phaseless_ratio)
-            r = numpy.random.random()
+            r = walker.uniform[i]
             # Is this necessary?
             # todo : mirror correction
             if norm > 0:
@@ -175,12 +227,86 @@ class Discrete(object):
                 walker.phi[i,:nup] = walker.phi[i,:nup] + vtup
                 walker.phi[i+soffset,nup:] = walker.phi[i+soffset,nup:] + vtdown
                 walker.update_overlap(probs, xi, trial.coeffs)
-                walker.field_configs.push(xi)
+                fields[i] = xi
                 walker.update_inverse_overlap(trial, vtup, vtdown, i)
             else:
                 walker.weight = 0
                 return
 
+    def two_body_delayed(self, walker, system, trial):
+        r"""Propagate by potential term using discrete HS transform.
+
+        Single determinant version of :meth:`two_body` using delayed updates.
+        Accepted single site updates of the inverse overlap matrix are
+        accumulated as a low rank correction :math:`A^{-1} - PQ`, which is
+        used to compute the diagonal of the Green's function for subsequent
+        sites, and are only applied to the inverse overlap matrix every ndelay
+        updates.
+
+        Parameters
+        ----------
+        walker : :class:`pauxy.walker` object
+            Walker object to be updated. On output we have acted on phi by
+            B_V(x) and updated the weight appropriately. Updates inplace.
+        system : :class:`pauxy.system.System`
+            System object.
+        trial : :class:`pauxy.trial_wavefunctioin.Trial`
+            Trial wavefunction object.
+        """
+        delta = self.delta
+        nup = system.nup
+        ndelay = self.ndelay
+        spins = [slice(0, nup), slice(nup, None)]
+        t = trial.psi_conj
+        P = [numpy.zeros(shape=(inv.shape[0], ndelay), dtype=inv.dtype)
+             for inv in walker.inv_ovlp]
+        Q = [numpy.zeros(shape=(ndelay, inv.shape[0]), dtype=inv.dtype)
+             for inv in walker.inv_ovlp]
+        # A^{-1} t_i for each spin, reused in the update if site is accepted.
+        q = [None, None]
+        if walker.field_configs is not None:
+            fields = walker.field_configs.next_configs
+        else:
+            fields = self.fields
+        k = 0
+        for i in range(0, system.nbasis):
+            for (s, cols) in enumerate(spins):
+                q[s] = (walker.inv_ovlp[s].dot(t[i,cols]) -
+                        P[s][:,:k].dot(Q[s][:k].dot(t[i,cols])))
+                walker.G[s][i,i] = walker.phi[i,cols].dot(q[s])
+            # Ratio of determinants for the two choices of auxilliary fields
+            probs = self.calculate_overlap_ratio(walker, delta, trial, i)
+            phaseless_ratio = numpy.maximum(probs.real, [0,0])
+            norm = sum(phaseless_ratio)
+            r = walker.uniform[i]
+            if norm > 0:
+                walker.weight = walker.weight * norm
+                if r < phaseless_ratio[0]/norm:
+                    xi = 0
+                else:
+                    xi = 1
+                for (s, cols) in enumerate(spins):
+                    vt = walker.phi[i,cols] * delta[xi, s]
+                    walker.phi[i,cols] = walker.phi[i,cols] + vt
+                    # Sherman-Morrison update of A^{-1} - PQ.
+                    vtA = (vt.dot(walker.inv_ovlp[s]) -
+                           vt.dot(P[s][:,:k]).dot(Q[s][:k]))
+                    P[s][:,k] = q[s] / (1.0+vt.dot(q[s]))
+                    Q[s][k] = vtA
+                walker.update_overlap(probs, xi, trial.coeffs)
+                fields[i] = xi
+                k += 1
+                if k == ndelay:
+                    for s in range(2):
+                        walker.inv_ovlp[s] -= P[s].dot(Q[s])
+                    k = 0
+            else:
+                walker.weight = 0
+                break
+        if k > 0:
+            for s in range(2):
+                walker.inv_ovlp[s] -= P[s][:,:k].dot(Q[s][:k])
+
     def propagate_walker_constrained(self, walker, system, trial):
         r"""Wrapper function for propagation using discrete transformation
 
@@ -206,6 +332,206 @@ class Discrete(object):
         if abs(walker.weight.real) > 0:
             self.kinetic_importance_sampling(walker, system, trial)
 
+    def propagate_walkers(self, psi, system, trial, sync=True):
+        r"""Propagate all walkers using discrete transformation.
+
+        Population version of :meth:`propagate_walker_constrained` which acts
+        on the stacked wavefunctions, so that the kinetic propagator is
+        applied to all walkers at once. If batched the potential term is also
+        vectorised over walkers, otherwise it is applied to each walker in
+        turn. Walkers which are killed during propagation are masked out of
+        subsequent updates.
+
+        With leapfrog the trailing kinetic half step is deferred unless sync
+        is true and combined with the first half step of the next step. The
+        importance sampling weight is still updated using the overlap with the
+        trial wavefunction propagated by half a step, so the walkers'
+        wavefunctions and relative weights are the same as without leapfrog.
+        The weights' overall normalisation is not, as the trial energy is
+        estimated from fewer samples.
+
+        Parameters
+        ----------
+        psi : :class:`pauxy.walkers.Walkers`
+            Walkers to be propagated. Must use a
+            :class:`pauxy.walkers.stack.WalkerStack`.
+        system : :class:`pauxy.system.System`
+            System object.
+        trial : :class:`pauxy.trial_wavefunctioin.Trial`
+            Trial wavefunction object.
+        sync : bool
+            If false the trailing kinetic half step may be deferred.
+        """
+        if self.free_projection:
+            self.propagate_walkers_free(psi, system, trial)
+            return
+        weights = numpy.array([w.weight for w in psi.walkers], dtype=float)
+        ots = (numpy.array([w.ot_sign for w in psi.walkers],
+                           dtype=psi.stack.phi.dtype),
+               numpy.array([w.log_ot for w in psi.walkers], dtype=float))
+        active = numpy.array([abs(w.weight) > 1e-8 and w.alive
+                              for w in psi.walkers], dtype=bool)
+        nhalf = 2 if self.deferred else 1
+        self.kinetic_importance_sampling_batched(psi.stack, system, trial,
+                                                 weights, ots, active, nhalf)
+        if self.batched:
+            self.two_body_batched(psi, system, trial, weights, ots, active)
+        else:
+            for iw in numpy.flatnonzero(active):
+                walker = psi.walkers[iw]
+                walker.weight = weights[iw]
+                (walker.ot_sign, walker.log_ot) = (ots[0][iw], ots[1][iw])
+                self.two_body(walker, system, trial)
+                weights[iw] = walker.weight
+                (ots[0][iw], ots[1][iw]) = (walker.ot_sign, walker.log_ot)
+                active[iw] = abs(walker.weight) > 0
+        self.deferred = self.leapfrog and not sync
+        nhalf = 0 if self.deferred else 1
+        self.kinetic_importance_sampling_batched(psi.stack, system, trial,
+                                                 weights, ots, active, nhalf)
+        for (w, weight, sign, log_ot) in zip(psi.walkers, weights, *ots):
+            w.weight = weight
+            (w.ot_sign, w.log_ot) = (sign, log_ot)
+
+    def kinetic_importance_sampling_batched(self, stack, system, trial,
+                                            weights, ots, active, nhalf=1):
+        r"""Propagate active walkers by the kinetic term.
+
+        Vectorised version of :meth:`kinetic_importance_sampling`. The
+        kinetic propagator is applied to the whole stack, which is harmless
+        for inactive walkers as they carry no weight.
+
+        Parameters
+        ----------
+        stack : :class:`pauxy.walkers.stack.WalkerStack`
+            Walkers' wavefunctions. Updated inplace.
+        system : :class:`pauxy.system.System`
+            System object.
+        trial : :class:`pauxy.trial_wavefunctioin.Trial`
+            Trial wavefunction object.
+        weights : :class:`numpy.ndarray`
+            Walker weights. Updated inplace.
+        ots : tuple of :class:`numpy.ndarray`
+            Signs and logs of magnitudes of walker overlaps with trial
+            wavefunction. Updated inplace.
+        active : :class:`numpy.ndarray`
+            Mask of walkers to propagate. Killed walkers are removed inplace.
+        nhalf : int
+            Number of kinetic half steps to apply. If 0 the half step is
+            deferred and the overlap is computed with the trial wavefunction
+            propagated by half a step instead. The inverse overlap matrices
+            are then not updated.
+        """
+        if nhalf == 2:
+            self.kinetic_batched(stack.phi, system,
+                                 self.kinetic_propagator_full)
+        elif nhalf == 1:
+            self.kinetic_batched(stack.phi, system, self.kinetic_propagator)
+        t = trial.psi_H if nhalf > 0 else self.psi_half_H
+        idx = numpy.flatnonzero(active)
+        nup = system.nup
+        (signs, logs) = ots
+        sign_new = numpy.ones(len(idx), dtype=signs.dtype)
+        log_new = numpy.zeros(len(idx))
+        for (s, cols) in enumerate([slice(0, nup), slice(nup, None)]):
+            ovlp = numpy.matmul(t[s], stack.phi[idx,:,cols])
+            (inv, sign, logdet) = inverse_slogdet(ovlp)
+            if nhalf > 0:
+                stack.inv_ovlp[s][idx] = inv
+            sign_new *= sign
+            log_new += logdet
+        ratio = sign_new / signs[idx] * numpy.exp(log_new-logs[idx])
+        accept = abs(numpy.angle(ratio)) < 0.5*math.pi
+        weights[idx] = numpy.where(accept, weights[idx]*ratio.real, 0.0)
+        signs[idx] = numpy.where(accept, sign_new, signs[idx])
+        logs[idx] = numpy.where(accept, log_new, logs[idx])
+        active[idx] = accept
+
+    def two_body_batched(self, psi, system, trial, weights, ots, active):
+        r"""Propagate active walkers by potential term.
+
+        Vectorised version of :meth:`two_body_delayed`. Each site is updated
+        for all walkers at once.
+
+        Parameters
+        ----------
+        psi : :class:`pauxy.walkers.Walkers`
+            Walkers to be propagated.
+        system : :class:`pauxy.system.System`
+            System object.
+        trial : :class:`pauxy.trial_wavefunctioin.Trial`
+            Trial wavefunction object.
+        weights : :class:`numpy.ndarray`
+            Walker weights. Updated inplace.
+        ots : tuple of :class:`numpy.ndarray`
+            Signs and logs of magnitudes of walker overlaps with trial
+            wavefunction. Updated inplace.
+        active : :class:`numpy.ndarray`
+            Mask of walkers to propagate. Killed walkers are removed inplace.
+        """
+        stack = psi.stack
+        delta = self.delta
+        nup = system.nup
+        ndelay = self.ndelay
+        nw = len(weights)
+        spins = [slice(0, nup), slice(nup, None)]
+        t = trial.psi_conj
+        P = [numpy.zeros(shape=(nw, inv.shape[1], ndelay), dtype=inv.dtype)
+             for inv in stack.inv_ovlp]
+        Q = [numpy.zeros(shape=(nw, ndelay, inv.shape[1]), dtype=inv.dtype)
+             for inv in stack.inv_ovlp]
+        q = [None, None]
+        gii = numpy.zeros(shape=(2, nw), dtype=stack.phi.dtype)
+        if psi.field_configs is not None:
+            fields = psi.field_configs.next_configs
+        else:
+            fields = None
+        k = 0
+        for i in range(0, system.nbasis):
+            for (s, cols) in enumerate(spins):
+                q[s] = (numpy.matmul(stack.inv_ovlp[s], t[i,cols]) -
+                        numpy.einsum('wak,wk->wa', P[s][:,:,:k],
+                                     numpy.matmul(Q[s][:,:k], t[i,cols])))
+                gii[s] = numpy.einsum('wa,wa->w', stack.phi[:,i,cols], q[s])
+                stack.G[active,s,i,i] = gii[s,active]
+            # Ratio of determinants for the two choices of auxilliary fields
+            probs = 0.5 * numpy.array([
+                (1+delta[0,0]*gii[0]) * (1+delta[0,1]*gii[1]),
+                (1+delta[1,0]*gii[0]) * (1+delta[1,1]*gii[1])
+            ])
+            phaseless_ratio = numpy.maximum(probs.real, 0)
+            norm = phaseless_ratio.sum(axis=0)
+            r = psi.random.uniform[:,i]
+            killed = active & (norm <= 0)
+            weights[killed] = 0.0
+            active &= ~killed
+            xi = numpy.where(r*norm < phaseless_ratio[0], 0, 1)
+            weights[active] *= norm[active]
+            for (s, cols) in enumerate(spins):
+                vt = (stack.phi[:,i,cols] * (delta[xi,s]*active)[:,None])
+                stack.phi[:,i,cols] += vt
+                vtA = (numpy.einsum('wa,wab->wb', vt, stack.inv_ovlp[s]) -
+                       numpy.einsum('wk,wkb->wb',
+                                    numpy.einsum('wa,wak->wk', vt,
+                                                 P[s][:,:,:k]),
+                                    Q[s][:,:k]))
+                denom = 1.0 + numpy.einsum('wa,wa->w', vt, q[s])
+                P[s][:,:,k] = q[s] / denom[:,None]
+                Q[s][:,k] = vtA
+            ratio = 2 * probs[xi,numpy.arange(nw)][active]
+            ots[0][active] *= ratio / abs(ratio)
+            ots[1][active] += numpy.log(abs(ratio))
+            if fields is not None:
+                fields[active,i] = xi[active]
+            k += 1
+            if k == ndelay:
+                for s in range(2):
+                    stack.inv_ovlp[s] -= numpy.matmul(P[s], Q[s])
+                k = 0
+        if k > 0:
+            for s in range(2):
+                stack.inv_ovlp[s] -= numpy.matmul(P[s][:,:,:k], Q[s][:,:k])
+
     def propagate_walker_free(self, walker, system, trial):
         r"""Propagate walker without imposing constraint.
 
@@ -222,11 +548,32 @@ class Discrete(object):
             Trial wavefunction object.
         """
         kinetic_real(walker.phi, system, self.bt2)
+        self.two_body_free(walker, system)
+        kinetic_real(walker.phi, system, self.bt2)
+        overlap = walker.inverse_overlap(trial.psi_H)
+        # Update walker weight
+        if overlap is None:
+            walker.ot = walker.calc_otrial(trial)
+        else:
+            (walker.ot_sign, walker.log_ot) = overlap
+        walker.greens_function(trial)
+
+    def two_body_free(self, walker, system):
+        r"""Propagate walker by potential term without imposing constraint.
+
+        Parameters
+        ----------
+        walker : :class:`pauxy.walker` object
+            Walker object to be updated. On output we have acted on phi by
+            B_V(x). Updates inplace.
+        system : :class:`pauxy.system.System`
+            System object.
+        """
         delta = self.delta
         nup = system.nup
         for i in range(0, system.nbasis):
             if abs(walker.weight) > 0:
-                r = numpy.random.random()
+                r = walker.uniform[i]
                 # TODO: remove code repition.
                 if r < 0.5:
                     xi = 0
@@ -236,11 +583,32 @@ class Discrete(object):
                 vtdown = walker.phi[i,nup:] * delta[xi, 1]
                 walker.phi[i,:nup] = walker.phi[i,:nup] + vtup
                 walker.phi[i,nup:] = walker.phi[i,nup:] + vtdown
-        kinetic_real(walker.phi, system, self.bt2)
-        walker.inverse_overlap(trial.psi)
-        # Update walker weight
-        walker.ot = walker.calc_otrial(trial.psi)
-        walker.greens_function(trial)
+
+    def propagate_walkers_free(self, psi, system, trial):
+        r"""Propagate all walkers without imposing constraint.
+
+        Population version of :meth:`propagate_walker_free` which applies the
+        kinetic propagator to the stacked wavefunctions of all walkers at
+        once.
+
+        Parameters
+        ----------
+        psi : :class:`pauxy.walkers.Walkers`
+            Walkers to be propagated. Must use a
+            :class:`pauxy.walkers.stack.WalkerStack`.
+        system : :class:`pauxy.system.System`
+            System object.
+        trial : :class:`pauxy.trial_wavefunctioin.Trial`
+            Trial wavefunction object.
+        """
+        active = [w for w in psi.walkers if abs(w.weight) > 1e-8 and w.alive]
+        kinetic_real_batched(psi.stack.phi, system, self.bt2)
+        for walker in active:
+            self.two_body_free(walker, system)
+        kinetic_real_batched(psi.stack.phi, system, self.bt2)
+        for walker in active:
+            (walker.ot_sign, walker.log_ot) = walker.inverse_overlap(trial.psi_H)
+            walker.greens_function(trial)
 
 # todo: stucture is the same for all continuous HS transformations.
 class Continuous(object):
@@ -265,12 +633,21 @@ class Continuous(object):
             print ("# Parsing continuous propagator input options.")
         self.hs_type = 'hubbard_continuous'
         self.free_projection = options.get('free_projection', False)
-        self.bt2 = numpy.array([scipy.linalg.expm(-0.5*qmc.dt*system.T[0]),
-                                scipy.linalg.expm(-0.5*qmc.dt*system.T[1])])
+        if options.get('checkerboard', False):
+            self.checkerboard = Checkerboard(system.T, 0.5*qmc.dt)
+            self.bt2 = self.checkerboard.matrix()
+        else:
+            self.checkerboard = None
+            self.bt2 = numpy.array([scipy.linalg.expm(-0.5*qmc.dt*system.T[0]),
+                                    scipy.linalg.expm(-0.5*qmc.dt*system.T[1])])
+        if qmc.ffts and self.checkerboard is None:
+            self.kspace = momentum_space(system, 0.5*qmc.dt, qmc.fft_workers,
+                                         verbose)
+        else:
+            self.kspace = None
         self.BT_BP = self.bt2
         self.back_propagate = back_propagate
         self.nstblz = qmc.nstblz
-        self.btk = numpy.exp(-0.5*qmc.dt*system.eks)
         model = system.__class__.__name__
         self.dt = qmc.dt
         # optimal mean-field shift for the hubbard model
@@ -281,14 +658,22 @@ class Continuous(object):
         self.mf_nsq = system.nbasis * self.mf_shift**2.0
         self.ebound = (2.0/self.dt)**0.5
         self.mean_local_energy = 0
+        # Work array for the diagonal potential propagators of a population.
+        self.vhs = None
+        # The local energy and field shift require the walkers' Green's
+        # function at the end of each step, so the trailing kinetic half step
+        # cannot be deferred.
+        self.leapfrog = False
+        # Random numbers required per walker per step.
+        self.nuniform = 0
+        self.nnormal = system.nbasis
         if self.free_projection:
             self.propagate_walker = self.propagate_walker_free_continuous
         else:
             self.propagate_walker = self.propagate_walker_constrained_continuous
-        if qmc.ffts:
-            self.kinetic = kinetic_kspace
-        else:
-            self.kinetic = kinetic_real
+        (self.kinetic, self.kinetic_batched,
+         self.kinetic_propagator) = select_kinetic(self.kspace,
+                                                   self.checkerboard, self.bt2)
         if verbose:
             print ("# Finished propagator input options.")
 
@@ -307,22 +692,81 @@ class Continuous(object):
             Simulation state.
         """
 
-        mf = self.mf_shift
-        ifac = self.iut_fac
-        ufac = self.ut_fac
-        nsq = self.mf_nsq
-        # Normally distrubted auxiliary fields.
-        xi = numpy.random.normal(0.0, 1.0, system.nbasis)
         # Optimal field shift for real local energy approximation.
-        shift = numpy.diag(walker.G[0])+numpy.diag(walker.G[1]) - mf
-        xi_opt = -ifac*shift
-        sxf = sum(xi-xi_opt)
+        shift = walker.G[0].diagonal() + walker.G[1].diagonal()
+        shift -= self.mf_shift
+        # Shifted normally distrubted auxiliary fields.
+        xshift = walker.normal + self.iut_fac*shift
         # Propagator for potential term with mean field and auxilary field shift.
-        c_xf = cmath.exp(0.5*ufac*nsq-ifac*mf*sxf)
-        EXP_VHS = numpy.exp(0.5*ufac*(1-2.0*mf)+ifac*(xi-xi_opt))
-        nup = system.nup
-        walker.phi[:,:nup] = numpy.einsum('i,ij->ij', EXP_VHS, walker.phi[:,:nup])
-        walker.phi[:,nup:] = numpy.einsum('i,ij->ij', EXP_VHS, walker.phi[:,nup:])
+        (c_xf, EXP_VHS) = self.potential_propagator(xshift)
+        # The potential is the same for both spins.
+        walker.phi *= EXP_VHS[:,None]
+        return c_xf
+
+    def potential_propagator(self, xshift):
+        r"""Diagonal potential propagator for given (shifted) auxiliary fields.
+
+        Parameters
+        ----------
+        xshift : :class:`numpy.ndarray`
+            Auxiliary fields (less the optimal shift) for a single walker, or
+            stack of walkers of shape (nwalkers, nbasis). Overwritten with
+            the diagonal of the propagator.
+
+        Returns
+        -------
+        c_xf : complex or :class:`numpy.ndarray`
+            Constant, field dependent factor of the propagator.
+        EXP_VHS : :class:`numpy.ndarray`
+            Diagonal of the propagator. Same array as xshift.
+        """
+        mf = self.mf_shift
+        sxf = xshift.sum(axis=-1)
+        c_xf = numpy.exp(0.5*self.ut_fac*self.mf_nsq-self.iut_fac*mf*sxf)
+        xshift *= self.iut_fac
+        xshift += 0.5*self.ut_fac*(1-2.0*mf)
+        EXP_VHS = numpy.exp(xshift, out=xshift)
+        return (c_xf, EXP_VHS)
+
+    def two_body_batched(self, psi, system, trial, active):
+        r"""Apply potential term to all active walkers.
+
+        Vectorised version of :meth:`two_body` and :meth:`two_body_free`.
+        The diagonal propagators are formed in a preallocated work array and
+        applied to the stacked wavefunctions inplace.
+
+        Parameters
+        ----------
+        psi : :class:`pauxy.walkers.Walkers`
+            Walkers to be propagated.
+        system : :class:`pauxy.system.System`
+            System object.
+        trial : :class:`pauxy.trial_wavefunctioin.Trial`
+            Trial wavefunction object.
+        active : :class:`numpy.ndarray`
+            Mask of walkers to propagate.
+
+        Returns
+        -------
+        c_xf : :class:`numpy.ndarray`
+            Constant, field dependent factor of the propagator for each
+            walker.
+        """
+        stack = psi.stack
+        xi = psi.random.normal
+        if self.vhs is None or self.vhs.shape != xi.shape:
+            self.vhs = numpy.zeros(xi.shape, dtype=stack.phi.dtype)
+        if self.free_projection:
+            numpy.copyto(self.vhs, xi)
+        else:
+            G = stack.G.diagonal(axis1=2, axis2=3)
+            numpy.add(G[:,0], G[:,1], out=self.vhs)
+            self.vhs -= self.mf_shift
+            self.vhs *= self.iut_fac
+            self.vhs += xi
+        (c_xf, EXP_VHS) = self.potential_propagator(self.vhs)
+        EXP_VHS[~active] = 1.0
+        stack.phi *= EXP_VHS[:,:,None]
         return c_xf
 
     def propagate_walker_free_continuous(self, walker, system, trial):
@@ -340,25 +784,53 @@ class Continuous(object):
         trial : :class:`pauxy.trial_wavefunctioin.Trial`
             Trial wavefunction object.
         """
-        nup = system.nup
         # 1. Apply kinetic projector.
         kinetic_real(walker.phi, system, self.bt2)
-        # Normally distributed random numbers.
-        xfields =  numpy.random.normal(0.0, 1.0, system.nbasis)
-        sxf = sum(xfields)
-        # Constant, field dependent term emerging when subtracting mean-field.
-        sc = 0.5*self.ut_fac*self.mf_nsq-self.iut_fac*self.mf_shift*sxf
-        c_xf = cmath.exp(sc)
-        # Potential propagator.
-        s = self.iut_fac*xfields + 0.5*self.ut_fac*(1-2*self.mf_shift)
-        bv = numpy.diag(numpy.exp(s))
         # 2. Apply potential projector.
-        walker.phi[:,:nup] = bv.dot(walker.phi[:,:nup])
-        walker.phi[:,nup:] = bv.dot(walker.phi[:,nup:])
+        c_xf = self.two_body_free(walker, system, trial)
         # 3. Apply kinetic projector.
         kinetic_real(walker.phi, system, self.bt2)
-        walker.inverse_overlap(trial.psi)
-        walker.ot = walker.calc_otrial(trial.psi)
+        self.update_weight_free(walker, system, trial, c_xf)
+
+    def two_body_free(self, walker, system, trial):
+        r"""Propagate walker by potential term without imposing constraint.
+
+        Parameters
+        ----------
+        walker : :class:`pauxy.walker` object
+            Walker object to be updated. On output we have acted on phi by
+            B_V(x). Updates inplace.
+        system : :class:`pauxy.system.System`
+            System object.
+        trial : :class:`pauxy.trial_wavefunctioin.Trial`
+            Trial wavefunction object.
+
+        Returns
+        -------
+        c_xf : complex
+            Constant, field dependent factor of the propagator.
+        """
+        # Normally distributed random numbers.
+        xfields = walker.normal.astype(walker.phi.dtype)
+        (c_xf, bv) = self.potential_propagator(xfields)
+        walker.phi *= bv[:,None]
+        return c_xf
+
+    def update_weight_free(self, walker, system, trial, c_xf):
+        r"""Update walker's overlap and weight after free propagation.
+
+        Parameters
+        ----------
+        walker : :class:`pauxy.walker` object
+            Propagated walker. Updates inplace.
+        system : :class:`pauxy.system.System`
+            System object.
+        trial : :class:`pauxy.trial_wavefunctioin.Trial`
+            Trial wavefunction object.
+        c_xf : complex
+            Constant factor returned by :meth:`two_body_free`.
+        """
+        (walker.ot_sign, walker.log_ot) = walker.inverse_overlap(trial.psi_H)
         walker.greens_function(trial)
         # Constant terms are included in the walker's weight.
         walker.weight = walker.weight * c_xf
@@ -381,28 +853,104 @@ class Continuous(object):
         """
 
         # 1. Apply kinetic projector.
-        self.kinetic(walker.phi, system, self.bt2)
+        self.kinetic(walker.phi, system, self.kinetic_propagator)
         # 2. Apply potential projector.
         cxf = self.two_body(walker, system, trial)
         # 3. Apply kinetic projector.
-        self.kinetic(walker.phi, system, self.bt2)
+        self.kinetic(walker.phi, system, self.kinetic_propagator)
+        self.update_weight_constrained(walker, system, trial, cxf)
+
+    def update_weight_constrained(self, walker, system, trial, cxf):
+        r"""Apply phaseless, real local energy approximation to walker.
 
-        # Now apply phaseless, real local energy approximation
-        walker.inverse_overlap(trial.psi)
+        Parameters
+        ----------
+        walker : :class:`pauxy.walker` object
+            Propagated walker. Updates inplace.
+        system : :class:`pauxy.system.System`
+            System object.
+        trial : :class:`pauxy.trial_wavefunction.Trial`
+            Trial wavefunction object.
+        cxf : complex
+            Constant factor returned by :meth:`two_body`.
+        """
+        (sign_new, log_new) = walker.inverse_overlap(trial.psi_H)
         walker.greens_function(trial)
         E_L = walker.local_energy(system)[0].real
         # Check for large population fluctuations
         E_L = local_energy_bound(E_L, self.mean_local_energy,
                                  self.ebound)
-        ot_new = walker.calc_otrial(trial.psi)
         # Walker's phase.
-        dtheta = cmath.phase(cxf*ot_new/walker.ot)
+        dtheta = cmath.phase(cxf*sign_new/walker.ot_sign)
         walker.weight = (walker.weight * math.exp(-0.5*self.dt*(walker.E_L+E_L))
                                        * max(0, math.cos(dtheta)))
         walker.E_L = E_L
-        walker.ot = ot_new
+        (walker.ot_sign, walker.log_ot) = (sign_new, log_new)
+
+    def propagate_walkers(self, psi, system, trial, sync=True):
+        r"""Propagate all walkers using continuous transformation.
+
+        Population version of :meth:`propagate_walker` which applies the
+        kinetic and potential propagators to the stacked wavefunctions of all
+        walkers at once. The weight update is applied to each walker in turn.
+
+        Parameters
+        ----------
+        psi : :class:`pauxy.walkers.Walkers`
+            Walkers to be propagated. Must use a
+            :class:`pauxy.walkers.stack.WalkerStack`.
+        system : :class:`pauxy.system.System`
+            System object.
+        trial : :class:`pauxy.trial_wavefunction.Trial`
+            Trial wavefunction object.
+        sync : bool
+            Not used. For interface consistency.
+        """
+        if self.free_projection:
+            (kinetic, B) = (kinetic_real_batched, self.bt2)
+            update_weight = self.update_weight_free
+        else:
+            (kinetic, B) = (self.kinetic_batched, self.kinetic_propagator)
+            update_weight = self.update_weight_constrained
+        active = numpy.array([abs(w.weight) > 1e-8 and w.alive
+                              for w in psi.walkers], dtype=bool)
+        kinetic(psi.stack.phi, system, B)
+        factors = self.two_body_batched(psi, system, trial, active)
+        kinetic(psi.stack.phi, system, B)
+        for iw in numpy.flatnonzero(active):
+            update_weight(psi.walkers[iw], system, trial, factors[iw])
 
 
+def select_kinetic(kspace, checkerboard, bt2):
+    """Select method for applying kinetic propagator.
+
+    Parameters
+    ----------
+    kspace : :class:`pauxy.propagation.kspace.MomentumSpace`
+        Kinetic propagator in momentum space. If not None the propagator is
+        applied using FFTs.
+    checkerboard : :class:`pauxy.propagation.checkerboard.Checkerboard`
+        Checkerboard decomposition of kinetic propagator. If None the dense
+        propagator is used.
+    bt2 : :class:`numpy.ndarray`
+        Dense kinetic propagator.
+
+    Returns
+    -------
+    kinetic : function
+        Kinetic propagator for single walker.
+    kinetic_batched : function
+        Kinetic propagator for stacked walkers.
+    propagator : object
+        Propagator passed to kinetic and kinetic_batched.
+    """
+    if kspace is not None:
+        return (kinetic_kspace, kinetic_kspace, kspace)
+    elif checkerboard is not None:
+        return (kinetic_checkerboard, kinetic_checkerboard, checkerboard)
+    else:
+        return (kinetic_real, kinetic_real_batched, bt2)
+
 def calculate_overlap_ratio_multi_ghf(walker, delta, trial, i):
     """Calculate overlap ratio for single site update with GHF trial.
 
@@ -494,10 +1042,9 @@ def construct_propagator_matrix(system, BT2, config, conjt=False):
     B : :class:`numpy.ndarray`
         Full projector matrix.
     """
-    bv_up = numpy.diag(numpy.array([system.auxf[xi, 0] for xi in config]))
-    bv_down = numpy.diag(numpy.array([system.auxf[xi, 1] for xi in config]))
-    Bup = BT2[0].dot(bv_up).dot(BT2[0])
-    Bdown = BT2[1].dot(bv_down).dot(BT2[1])
+    bv = system.auxf[config].T
+    Bup = BT2[0].dot(bv[0][:,None]*BT2[0])
+    Bdown = BT2[1].dot(bv[1][:,None]*BT2[1])
 
     if conjt:
         return numpy.array([Bup.conj().T, Bdown.conj().T])
@@ -526,25 +1073,89 @@ def construct_propagator_matrix_ghf(system, BT2, config, conjt=False):
     B : :class:`numpy.ndarray`
         Full projector matrix.
     """
-    bv_up = numpy.diag(numpy.array([system.auxf[xi, 0] for xi in config]))
-    bv_down = numpy.diag(numpy.array([system.auxf[xi, 1] for xi in config]))
-    BV = scipy.linalg.block_diag(bv_up, bv_down)
-    B = BT2.dot(BV).dot(BT2)
+    bv = system.auxf[config].T.ravel()
+    B = BT2.dot(bv[:,None]*BT2)
 
     if conjt:
         return B.conj().T
     else:
         return B
 
+def propagate_auxf(phi, system, BT2, config, conjt=False):
+    r"""Apply projector for a configuration of auxiliary fields inplace.
+
+    For use with discrete transformation. The projector :math:`B =
+    B_{T/2}B_V(x)B_{T/2}` is never formed. Instead the one-body propagator and
+    the diagonal auxiliary field propagator are applied in turn, which costs
+    :math:`O(N^2 N_e)` rather than :math:`O(N^3)`.
+
+    Parameters
+    ----------
+    phi : :class:`numpy.ndarray`
+        Wavefunction of shape (nbasis, ne) or stack of wavefunctions of shape
+        (nwalkers, nbasis, ne). Updated inplace.
+    system : class
+        System class.
+    BT2 : :class:`numpy.ndarray`
+        One body propagator.
+    config : :class:`numpy.ndarray`
+        Auxiliary field configuration of shape (nbasis,), or (nwalkers,
+        nbasis) for a stack of wavefunctions.
+    conjt : bool
+        If true apply Hermitian conjugate of projector.
+    """
+    nup = system.nup
+    bv = system.auxf[config]
+    if conjt:
+        BT2 = BT2.conj().swapaxes(-1, -2)
+        bv = bv.conj()
+    for (s, cols) in enumerate([slice(0, nup), slice(nup, None)]):
+        psi = numpy.matmul(BT2[s], phi[...,cols])
+        psi *= bv[...,s,None]
+        numpy.matmul(BT2[s], psi, out=psi)
+        phi[...,cols] = psi
+
+
+def propagate_auxf_ghf(phi, system, BT2, config, conjt=False):
+    r"""Apply projector for a configuration of auxiliary fields inplace.
+
+    For use with GHF trial wavefunction. See :func:`propagate_auxf`.
+
+    Parameters
+    ----------
+    phi : :class:`numpy.ndarray`
+        Wavefunction of shape (2*nbasis, ne). Updated inplace.
+    system : class
+        System class.
+    BT2 : :class:`numpy.ndarray`
+        One body propagator.
+    config : :class:`numpy.ndarray`
+        Auxiliary field configuration.
+    conjt : bool
+        If true apply Hermitian conjugate of projector.
+    """
+    bv = system.auxf[config].T.ravel()
+    if conjt:
+        BT2 = BT2.conj().T
+        bv = bv.conj()
+    psi = BT2.dot(phi)
+    psi *= bv[:,None]
+    phi[:] = BT2.dot(psi)
+
+
 def back_propagate(system, psi, trial, nstblz, BT2, dt):
     r"""Perform back propagation for UHF style wavefunction.
 
+    All walkers are advanced through each time slice together by applying the
+    projectors to the stacked wavefunctions.
+
     Parameters
     ---------
     system : system object in general.
         Container for model input options.
     psi : :class:`pauxy.walkers.Walkers` object
-        CPMC wavefunction.
+        CPMC wavefunction. The walkers' back propagated wavefunctions,
+        psi.stack.phi_bp, are propagated inplace from their current values.
     trial : :class:`pauxy.trial_wavefunction.X' object
         Trial wavefunction class.
     nstblz : int
@@ -553,25 +1164,34 @@ def back_propagate(system, psi, trial, nstblz, BT2, dt):
         One body propagator.
     dt : float
         Timestep.
-
-    Returns
-    -------
-    psi_bp : list of :class:`pauxy.walker.Walker` objects
-        Back propagated list of walkers.
     """
+    configs = psi.field_configs.get_block(slice(None))[0]
+    back_propagate_batched(psi.stack.phi_bp, system, configs, nstblz, BT2)
+
 
-    psi_bp = [SingleDetWalker(1, system, trial, w) for w in range(len(psi))]
+def back_propagate_batched(phi, system, configs, nstblz, BT2):
+    r"""Back propagate stacked wavefunctions along their stored field paths.
+
+    Parameters
+    ---------
+    phi : :class:`numpy.ndarray`
+        Wavefunctions of shape (nwalkers, nbasis, ne). Updated inplace.
+    system : system object in general.
+        Container for model input options.
+    configs : :class:`numpy.ndarray`
+        Auxiliary field configurations of shape (nwalkers, nsteps, nbasis).
+    nstblz : int
+        Number of steps between GS orthogonalisation.
+    BT2 : :class:`numpy.ndarray`
+        One body propagator.
+    """
     nup = system.nup
-    for (iw, w) in enumerate(psi):
-        # propagators should be applied in reverse order
-        for (i, c) in enumerate(w.field_configs.get_block()[0][::-1]):
-            B = construct_propagator_matrix(system, BT2,
-                                            c, conjt=True)
-            psi_bp[iw].phi[:,:nup] = B[0].dot(psi_bp[iw].phi[:,:nup])
-            psi_bp[iw].phi[:,nup:] = B[1].dot(psi_bp[iw].phi[:,nup:])
-            if i != 0 and i % nstblz == 0:
-                psi_bp[iw].reortho(trial)
-    return psi_bp
+    # propagators should be applied in reverse order
+    for (i, c) in enumerate(configs[:,::-1].swapaxes(0, 1)):
+        propagate_auxf(phi, system, BT2, c, conjt=True)
+        if i != 0 and i % nstblz == 0:
+            phi[:,:,:nup] = reortho_batched(phi[:,:,:nup])
+            phi[:,:,nup:] = reortho_batched(phi[:,:,nup:])
 
 def back_propagate_ghf(system, psi, trial, nstblz, BT2, dt):
     r"""Perform back propagation for GHF style wavefunction.
@@ -597,15 +1217,13 @@ def back_propagate_ghf(system, psi, trial, nstblz, BT2, dt):
         Back propagated list of walkers.
     """
     psi_bp = [MultiGHFWalker(1, system, trial, w, weights='ones', wfn0='GHF')
-              for w in range(len(psi))]
-    for (iw, w) in enumerate(psi):
+              for w in range(len(psi.walkers))]
+    for (iw, w) in enumerate(psi.walkers):
         # propagators should be applied in reverse order
         for (i, c) in enumerate(w.field_configs.get_block()[0][::-1]):
-            B = construct_propagator_matrix_ghf(system, BT2,
-                                                c, conjt=True)
             for (idet, psi_i) in enumerate(psi_bp[iw].phi):
                 # propagate each component of multi-determinant expansion
-                psi_bp[iw].phi[idet] = B.dot(psi_bp[iw].phi[idet])
+                propagate_auxf_ghf(psi_i, system, BT2, c, conjt=True)
                 if i != 0 and i % nstblz == 0:
                     # implicitly propagating the full GHF wavefunction
                     (psi_bp[iw].phi[idet], detR) = reortho(psi_i)
@@ -643,9 +1261,7 @@ def back_propagate_single(phi_in, configs, weights,
     nup = system.nup
     psi_store = []
     for (i, c) in enumerate(configs[::-1]):
-        B = construct_propagator_matrix(system, BT2, c, conjt=True)
-        phi_in[:,:nup] = B[0].dot(phi_in[:,:nup])
-        phi_in[:,nup:] = B[1].dot(phi_in[:,nup:])
+        propagate_auxf(phi_in, system, BT2, c, conjt=True)
         if i != 0 and i % nstblz == 0:
             (phi_in[:,:nup], R) = reortho(phi_in[:,:nup])
             (phi_in[:,nup:], R) = reortho(phi_in[:,nup:])
@@ -685,10 +1301,9 @@ def back_propagate_single_ghf(phi, configs, weights, system,
     nup = system.nup
     psi_store = []
     for (i, c) in enumerate(configs[::-1]):
-        B = construct_propagator_matrix_ghf(system, BT2, c, conjt=True)
         for (idet, psi_i) in enumerate(phi):
             # propagate each component of multi-determinant expansion
-            phi[idet] = B.dot(phi[idet])
+            propagate_auxf_ghf(psi_i, system, BT2, c, conjt=True)
             if i != 0 and i % nstblz == 0:
                 # implicitly propagating the full GHF wavefunction
                 (phi[idet], detR) = reortho(psi_i)
@@ -697,39 +1312,3 @@ def back_propagate_single_ghf(phi, configs, weights, system,
             psi_store.append(copy.deepcopy(phi))
 
     return psi_store
-
-
-def kinetic_kspace(phi, system, btk):
-    """Apply the kinetic energy projector in kspace.
-
-    May be faster for very large dilute lattices.
-
-    Parameters
-    ---------
-    phi : :class:`pauxy.walkers.MultiGHFWalker` object
-        Walker.
-    system : system object in general.
-        Container for model input options.
-    B : :class:`numpy.ndarray`
-        One body propagator.
-    """
-    s = system
-    # Transform psi to kspace by fft-ing its columns.
-    tup = fft_wavefunction(phi[:,:s.nup], s.nx, s.ny,
-                           s.nup, phi[:,:s.nup].shape)
-    tdown = fft_wavefunction(phi[:,s.nup:], s.nx, s.ny,
-                             s.ndown, phi[:,s.nup:].shape)
-    # Kinetic enery operator is diagonal in momentum space.
-    # Note that multiplying by diagonal btk in this way is faster than using
-    # einsum and way faster than using dot using an actual diagonal matrix.
-    tup = (btk*tup.T).T
-    tdown = (btk*tdown.T).T
-    # Transform phi to kspace by fft-ing its columns.
-    tup = ifft_wavefunction(tup, s.nx, s.ny, s.nup, tup.shape)
-    tdown = ifft_wavefunction(tdown, s.nx, s.ny, s.ndown, tdown.shape)
-    if phi.dtype == float:
-        phi[:,:s.nup] = tup.astype(float)
-        phi[:,s.nup:] = tdown.astype(float)
-    else:
-        phi[:,:s.nup] = tup
-        phi[:,s.nup:] = tdown
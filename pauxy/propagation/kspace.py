@@ -0,0 +1,189 @@
+"""Momentum space application of one-body propagators for lattice models."""
+import copy
+import numpy
+import scipy.fft
+import warnings
+
+
+class MomentumSpace(object):
+    r"""Kinetic propagator :math:`e^{-\Delta\tau T}` applied using FFTs.
+
+    For translationally invariant hopping :math:`T` is diagonal in momentum
+    space so the propagator can be applied to a wavefunction at a cost of
+    :math:`O(N\log N N_e)` rather than :math:`O(N^2 N_e)`. Twisted boundary
+    conditions are handled by the gauge transformation
+
+    .. math::
+        \phi(\mathbf{r}) \rightarrow e^{i\boldsymbol{\theta}\cdot\mathbf{r}}
+            \phi(\mathbf{r}),\quad \theta_d = \pi k_d / L_d,
+
+    which spreads the boundary phase uniformly over the bonds. The
+    eigenvalues of :math:`T` are computed numerically from its first column
+    so that any translationally invariant one-body operator in one or two
+    dimensions is supported. Walkers are transformed in a single call for the
+    whole population and both spins. Real wavefunctions use real to complex
+    transforms when :math:`T` is real.
+
+    Parameters
+    ----------
+    system : :class:`pauxy.systems.hubbard.Hubbard`
+        Lattice model.
+    dt : float
+        Timestep.
+    workers : int
+        Number of threads used by the FFTs.
+
+    Attributes
+    ----------
+    eks : :class:`numpy.ndarray`
+        Eigenvalues of :math:`T` for each spin arranged on the reciprocal
+        lattice.
+    btk : :class:`numpy.ndarray`
+        Propagator in momentum space for each spin.
+    error : float
+        Largest deviation of the momentum space representation of :math:`T`
+        from :math:`T`.
+    """
+
+    def __init__(self, system, dt, workers=1):
+        self.workers = workers
+        if system.ny == 1:
+            self.shape = (system.nx,)
+        else:
+            self.shape = (system.ny, system.nx)
+        ndim = len(self.shape)
+        nbasis = system.nbasis
+        ktwist = numpy.array(system.ktwist)
+        if ktwist.ndim == 0:
+            ktwist = numpy.zeros(ndim)
+        # Lattice coordinates in the order (x, y) from the grid (y, x).
+        r = numpy.indices(self.shape)[::-1].reshape(ndim, nbasis)
+        L = numpy.array(self.shape[::-1]).reshape(ndim, 1)
+        theta = numpy.pi * numpy.sum(ktwist.reshape(ndim, 1)*r/L, axis=0)
+        if numpy.any(theta != 0):
+            self.phase = numpy.exp(-1j*theta)
+        else:
+            self.phase = None
+        T = system.T
+        if self.phase is not None:
+            T = self.phase.conj()[:,None] * T * self.phase[None,:]
+        self.real = self.phase is None and numpy.all(numpy.isreal(T))
+        self.eks = scipy.fft.fftn(T[:,:,0].reshape((2,)+self.shape),
+                                  axes=tuple(range(1, ndim+1)))
+        if self.real:
+            self.eks = self.eks.real
+        # Check T is diagonal by transforming it back to real space.
+        self.btk = self.eks
+        self.error = numpy.max(numpy.abs(self.matrix()-system.T))
+        self.btk = numpy.exp(-dt*self.eks)
+
+    def apply(self, phi, nup):
+        """Apply propagator to wavefunction inplace.
+
+        Parameters
+        ----------
+        phi : :class:`numpy.ndarray`
+            Walker's wavefunction of shape (nbasis, ne), or walkers'
+            wavefunctions of shape (nwalkers, nbasis, ne).
+        nup : int
+            Number of up electrons. The first nup columns of phi are
+            propagated with the spin up propagator.
+        """
+        grid = phi.shape[:-2] + self.shape + phi.shape[-1:]
+        axes = tuple(range(phi.ndim-2, phi.ndim-2+len(self.shape)))
+        psi = phi.reshape(grid)
+        if self.real and numpy.isrealobj(phi):
+            n = self.shape[-1] // 2 + 1
+            psik = scipy.fft.rfftn(psi, axes=axes, workers=self.workers)
+            psik[...,:nup] *= self.btk[0][...,:n,None]
+            psik[...,nup:] *= self.btk[1][...,:n,None]
+            psi = scipy.fft.irfftn(psik, s=self.shape, axes=axes,
+                                   overwrite_x=True, workers=self.workers)
+        else:
+            if self.phase is not None:
+                psi = psi * self.phase.conj().reshape(self.shape+(1,))
+            psik = scipy.fft.fftn(psi, axes=axes, workers=self.workers)
+            psik[...,:nup] *= self.btk[0][...,None]
+            psik[...,nup:] *= self.btk[1][...,None]
+            psi = scipy.fft.ifftn(psik, axes=axes, overwrite_x=True,
+                                  workers=self.workers)
+            if self.phase is not None:
+                psi *= self.phase.reshape(self.shape+(1,))
+        phi[:] = psi.reshape(phi.shape)
+
+    def squared(self):
+        """Propagator for twice the timestep.
+
+        Returns
+        -------
+        squared : :class:`MomentumSpace`
+            Propagator for twice the timestep.
+        """
+        squared = copy.copy(self)
+        squared.btk = self.btk**2
+        return squared
+
+    def matrix(self):
+        """Dense representation of the propagator.
+
+        Returns
+        -------
+        B : :class:`numpy.ndarray`
+            Propagator matrix for each spin.
+        """
+        nbasis = numpy.prod(self.shape)
+        dtype = float if self.real else complex
+        B = numpy.array([numpy.identity(nbasis, dtype=dtype)
+                         for s in range(2)])
+        self.apply(B[0], nbasis)
+        self.apply(B[1], 0)
+        return B
+
+
+def momentum_space(system, dt, workers=1, verbose=False):
+    """Set up momentum space propagator if the one-body operator allows it.
+
+    Parameters
+    ----------
+    system : :class:`pauxy.systems.hubbard.Hubbard`
+        Lattice model.
+    dt : float
+        Timestep.
+    workers : int
+        Number of threads used by the FFTs.
+    verbose : bool
+        Print more information.
+
+    Returns
+    -------
+    kspace : :class:`MomentumSpace` or None
+        Momentum space propagator or None if the one-body operator is not
+        translationally invariant, e.g., with pinning fields.
+    """
+    kspace = MomentumSpace(system, dt, workers)
+    if verbose:
+        print("# Error in momentum space one-body operator: "
+              "%13.8e"%kspace.error)
+    if kspace.error > 1e-8:
+        warnings.warn('One-body operator is not diagonal in momentum space. '
+                      'Applying kinetic propagator in real space.')
+        return None
+    return kspace
+
+
+def kinetic_kspace(phi, system, kspace):
+    r"""Propagate by the kinetic term in momentum space.
+
+    Acts on either a single walker's wavefunction or a stack of walkers.
+
+    Parameters
+    ----------
+    phi : :class:`numpy.ndarray`
+        Walker's wavefunction of shape (nbasis, ne), or walkers' wavefunctions
+        of shape (nwalkers, nbasis, ne). Updated inplace.
+    system : system object in general.
+        Container for model input options.
+    kspace : :class:`MomentumSpace`
+        Momentum space propagator.
+    """
+    kspace.apply(phi, system.nup)
@@ -47,6 +47,50 @@ def kinetic_real(phi, system, bt2):
     phi[:,nup:] = bt2[1].dot(phi[:,nup:])
 
 
+def kinetic_real_batched(phi, system, bt2):
+    r"""Propagate a population of walkers by the kinetic term.
+
+    Batched version of :func:`kinetic_real`. For each spin the walkers'
+    wavefunctions are arranged as a single (nbasis, nwalkers*nspin) matrix so
+    the propagator is applied to the whole population with one matrix
+    multiplication rather than one per walker.
+
+    Parameters
+    ----------
+    phi : :class:`numpy.ndarray`
+        Walkers' wavefunctions. Shape (nwalkers, nbasis, ne). Updated inplace.
+    system : system object in general.
+        Container for model input options.
+    bt2 : :class:`numpy.ndarray`
+        Propagator for each spin.
+    """
+    nup = system.nup
+    (nw, nbasis, ne) = phi.shape
+    for (s, cols) in enumerate([slice(0, nup), slice(nup, None)]):
+        X = phi[:,:,cols].transpose(1, 0, 2).reshape(nbasis, -1)
+        Y = bt2[s].dot(X).reshape(nbasis, nw, -1)
+        phi[:,:,cols] = Y.transpose(1, 0, 2)
+
+
+def half_step_trial(psi_H, bt2):
+    r"""Trial wavefunction propagated by half a kinetic step.
+
+    Used to compute overlaps :math:`\langle\Psi_T|B_{T/2}|\phi\rangle` without
+    applying the kinetic propagator to the walker.
+
+    Parameters
+    ----------
+    psi_H : list of :class:`numpy.ndarray`
+        Conjugate transpose of trial wavefunction for each spin.
+    bt2 : :class:`numpy.ndarray`
+        Kinetic propagator for each spin.
+
+    Returns
+    -------
+    psi_half_H : list of :class:`numpy.ndarray`
+        :math:`\langle\Psi_T|B_{T/2}` for each spin.
+    """
+    return [psi_H[0].dot(bt2[0]), psi_H[1].dot(bt2[1])]
 
 def local_energy_bound(local_energy, mean, threshold):
     """Try to suppress rare population events by imposing local energy bound.
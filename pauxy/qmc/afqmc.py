@@ -1,6 +1,7 @@
 """Driver to perform AFQMC calculation"""
 import sys
 import json
+import os
 import time
 import numpy
 import warnings
@@ -13,6 +14,8 @@ from pauxy.propagation.utils import get_propagator
 from pauxy.qmc.options import QMCOpts
 from pauxy.systems.utils import get_system
 from pauxy.trial_wavefunction.utils import get_trial_wavefunction
+from pauxy.utils.io import (open_distributed_file,
+                             write_distributed_dataset)
 from pauxy.utils.misc import get_git_revision_hash, serialise
 from pauxy.walkers.handler import Walkers
 
@@ -107,7 +110,13 @@ class AFQMC(object):
             )
             self.psi = Walkers(self.system, self.trial, self.qmc.nwalkers,
                                self.estimators.nprop_tot,
-                               self.estimators.nbp, verbose)
+                               self.estimators.nbp, verbose,
+                               self.qmc.pop_control,
+                               self.qmc.pop_control_min_weight,
+                               self.qmc.pop_control_max_weight,
+                               self.estimators.back_propagation or
+                               self.estimators.calc_itcf,
+                               self.qmc.single_precision_fields)
             json.encoder.FLOAT_REPR = lambda o: format(o, '.6f')
             json_string = json.dumps(serialise(self, verbose=1),
                                      sort_keys=False, indent=4)
@@ -131,45 +140,211 @@ class AFQMC(object):
         """
         if psi is not None:
             self.psi = psi
+        elif self.qmc.init_walkers is not None and not self.qmc.restart:
+            if self.psi.stack is None:
+                if self.root:
+                    warnings.warn('Initialising walkers from file is not '
+                                  'implemented for multi-determinant walkers.')
+            else:
+                self.psi.read_walkers(comm, self.qmc.init_walkers,
+                                      self.system, self.trial)
         (E_T, ke, pe) = self.psi.walkers[0].local_energy(self.system)
-        self.propagators.mean_local_energy = E_T.real
-        # Calculate estimates for initial distribution of walkers.
-        self.estimators.estimators['mixed'].update(self.system, self.qmc,
-                                                   self.trial, self.psi, 0,
-                                                   self.propagators.free_projection)
-        # Print out zeroth step for convenience.
+        # All processors use the same trial energy.
+        E_T = comm.bcast(E_T.real, root=0)
+        self.propagators.mean_local_energy = E_T
         if self.root:
             self.estimators.estimators['mixed'].print_key()
             self.estimators.estimators['mixed'].print_header()
-        self.estimators.estimators['mixed'].print_step(comm, self.nprocs, 0, 1)
+        # Random numbers are keyed by walkers' stream labels and the step.
+        # Walkers are initially labelled by their global index.
+        self.psi.add_random_streams(self.seed, self.propagators.nuniform,
+                                    self.propagators.nnormal,
+                                    self.qmc.nrandom_steps,
+                                    comm.rank*len(self.psi.walkers))
+        checkpoint = self.qmc.ncheckpoint > 0 or self.qmc.restart
+        if checkpoint and self.psi.stack is None:
+            if self.root:
+                warnings.warn('Checkpointing is not implemented for '
+                              'multi-determinant walkers.')
+            checkpoint = False
+        if checkpoint and self.qmc.restart:
+            (start, E_T, nsample) = self.read_checkpoint(comm)
+        else:
+            # Calculate estimates for initial distribution of walkers.
+            self.estimators.estimators['mixed'].update(self.system, self.qmc,
+                                                       self.trial, self.psi, 0,
+                                                       self.propagators.free_projection)
+            # Print out zeroth step for convenience.
+            self.estimators.estimators['mixed'].print_step(comm, self.nprocs,
+                                                           0, 1)
+            start = 0
+            nsample = 0
+        leapfrog = self.propagators.leapfrog and self.psi.stack is not None
+        if leapfrog and len(self.estimators.estimators) > 1:
+            if self.root:
+                warnings.warn('Leapfrog propagation is not implemented for '
+                              'back propagated estimates or imaginary time '
+                              'correlation functions.')
+            leapfrog = False
+        if leapfrog and self.qmc.nsample == 1 and self.root:
+            warnings.warn('Leapfrog propagation has no effect unless nsample '
+                          'is greater than 1.')
 
-        for step in range(1, self.qmc.nsteps + 1):
+        for step in range(start+1, self.qmc.nsteps + 1):
+            self.psi.random.set_step(step)
+            sync = not leapfrog or self.sync_step(step, checkpoint)
+            if self.psi.stack is not None:
+                self.propagators.propagate_walkers(self.psi, self.system,
+                                                   self.trial, sync)
+            else:
+                for w in self.psi.walkers:
+                    # Want to possibly allow for walkers with negative /
+                    # complex weights when not using a constraint. I'm not so
+                    # sure about the criteria for complex weighted walkers.
+                    if abs(w.weight) > 1e-8 and w.alive:
+                        self.propagators.propagate_walker(
+                            w, self.system, self.trial)
             for w in self.psi.walkers:
-                # Want to possibly allow for walkers with negative / complex weights
-                # when not using a constraint. I'm not so sure about the criteria
-                # for complex weighted walkers.
-                if abs(w.weight) > 1e-8 and w.alive:
-                    self.propagators.propagate_walker(
-                        w, self.system, self.trial)
                 # Constant factors
                 w.weight = w.weight * exp(self.qmc.dt * E_T.real)
+            if self.psi.field_configs is not None:
+                self.psi.field_configs.push()
             # calculate estimators
-            self.estimators.update(self.system, self.qmc,
-                                   self.trial, self.psi, step,
-                                   self.propagators.free_projection)
+            if step % self.qmc.nsample == 0:
+                self.estimators.update(self.system, self.qmc,
+                                       self.trial, self.psi, step,
+                                       self.propagators.free_projection)
+                nsample += 1
             if step % self.qmc.nstblz == 0:
                 self.psi.orthogonalise(self.trial,
                                        self.propagators.free_projection)
             if step % self.qmc.nupdate_shift == 0:
-                E_T = self.estimators.estimators['mixed'].projected_energy()
+                E_T = self.estimators.estimators['mixed'].projected_energy(comm)
             if step % self.qmc.nmeasure == 0:
-                self.estimators.print_step(comm, self.nprocs, step,
-                                           self.qmc.nmeasure)
+                self.estimators.print_step(comm, self.nprocs, step, nsample)
+                nsample = 0
             if step < self.qmc.nequilibrate:
                 # Update local energy bound.
                 self.propagators.mean_local_energy = E_T
             if step % self.qmc.npop_control == 0:
                 self.psi.pop_control(comm)
+            if (checkpoint and self.qmc.ncheckpoint > 0 and
+                    step % self.qmc.ncheckpoint == 0):
+                self.write_checkpoint(comm, step, E_T, nsample)
+        if self.qmc.write_walkers:
+            if self.psi.stack is None:
+                if self.root:
+                    warnings.warn('Writing walkers to file is not implemented '
+                                  'for multi-determinant walkers.')
+            else:
+                self.psi.write_walkers(comm, self.estimators.h5f)
+
+    def sync_step(self, step, checkpoint):
+        """Determine whether walkers must be fully propagated at a step.
+
+        With leapfrog propagation the trailing one-body half step is only
+        applied on steps after which the walkers' wavefunctions are required,
+        i.e., when estimates are accumulated or printed, the trial energy is
+        updated, the walkers are orthogonalised or population control is
+        performed, when a checkpoint is written and on the final step.
+
+        Parameters
+        ----------
+        step : int
+            Current iteration number.
+        checkpoint : bool
+            True if checkpoints are being written.
+
+        Returns
+        -------
+        sync : bool
+            True if walkers must be fully propagated.
+        """
+        q = self.qmc
+        intervals = [q.nsample, q.nmeasure, q.nupdate_shift, q.nstblz,
+                     q.npop_control]
+        if checkpoint and q.ncheckpoint > 0:
+            intervals.append(q.ncheckpoint)
+        return step == q.nsteps or any(step % n == 0 for n in intervals)
+
+    def write_checkpoint(self, comm, step, E_T, nsample):
+        """Write current state of calculation to checkpoint file.
+
+        Data which is only held by the root processor is written first. Each
+        processor's state is then written to its own slice of the checkpoint's
+        datasets, see :func:`pauxy.utils.io.write_distributed_dataset`. The
+        checkpoint is first written to a temporary file which then replaces
+        any existing checkpoint, so that the previous checkpoint survives if
+        the calculation is killed while writing.
+
+        Parameters
+        ----------
+        comm : MPI communicator
+        step : int
+            Current iteration number.
+        E_T : float
+            Current trial energy.
+        nsample : int
+            Number of samples accumulated in estimators since they were last
+            printed.
+        """
+        tmp = self.qmc.checkpoint + '.tmp'
+        if self.root:
+            with h5py.File(tmp, 'w') as h5f:
+                h5f.attrs['step'] = step
+                h5f.attrs['nsample'] = nsample
+                h5f.attrs['nprocs'] = comm.size
+                self.estimators.write_outputs_checkpoint(h5f)
+        comm.Barrier()
+        h5f = open_distributed_file(comm, tmp, 'a')
+        energies = numpy.array([E_T, self.propagators.mean_local_energy])
+        write_distributed_dataset(comm, h5f, 'energies', energies)
+        (name, keys, pos, has_gauss, gauss) = numpy.random.get_state()
+        write_distributed_dataset(comm, h5f, 'rng/keys', keys)
+        write_distributed_dataset(comm, h5f, 'rng/state',
+                                  numpy.array([pos, has_gauss, gauss]))
+        self.psi.write_checkpoint(comm, h5f)
+        self.estimators.write_checkpoint(comm, h5f)
+        if h5f is not None:
+            h5f.close()
+        if self.root:
+            os.replace(tmp, self.qmc.checkpoint)
+
+    def read_checkpoint(self, comm):
+        """Restore state of calculation from checkpoint file.
+
+        Parameters
+        ----------
+        comm : MPI communicator
+
+        Returns
+        -------
+        step : int
+            Iteration number at which checkpoint was written.
+        E_T : float
+            Trial energy at checkpoint.
+        nsample : int
+            Number of samples accumulated in estimators at checkpoint.
+        """
+        with h5py.File(self.qmc.checkpoint, 'r') as h5f:
+            if h5f.attrs['nprocs'] != comm.size:
+                if self.root:
+                    warnings.warn('Checkpoint was written using %d cores. '
+                                  'Exiting.'%h5f.attrs['nprocs'])
+                sys.exit()
+            (E_T, self.propagators.mean_local_energy) = h5f['energies'][comm.rank]
+            (pos, has_gauss, gauss) = h5f['rng/state'][comm.rank]
+            numpy.random.set_state(('MT19937', h5f['rng/keys'][comm.rank],
+                                    int(pos), int(has_gauss), gauss))
+            self.psi.read_checkpoint(comm, h5f)
+            self.estimators.read_checkpoint(comm, h5f)
+            step = int(h5f.attrs['step'])
+            nsample = int(h5f.attrs.get('nsample',
+                                        step % self.qmc.nmeasure))
+        if self.root:
+            print("# Restarting from step %d of %s."%(step,
+                                                      self.qmc.checkpoint))
+        return (step, E_T, nsample)
 
     def finalise(self, verbose):
         """Tidy up.
@@ -200,5 +375,5 @@ class AFQMC(object):
         """
         hs_type = propagator.get('hubbard_stratonovich', 'discrete')
         continuous = 'continuous' in hs_type
-        twist = system.ktwist.all() is not None
+        twist = system.ktwist.ndim > 0
         return continuous or twist
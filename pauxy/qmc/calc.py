@@ -136,7 +136,14 @@ def setup_parallel(options, comm=None, verbose=False):
                         afqmc.trial,
                         afqmc.qmc.nwalkers,
                         afqmc.estimators.nprop_tot,
-                        afqmc.estimators.nbp)
+                        afqmc.estimators.nbp,
+                        pop_control=afqmc.qmc.pop_control,
+                        min_weight=afqmc.qmc.pop_control_min_weight,
+                        max_weight=afqmc.qmc.pop_control_max_weight,
+                        history=(afqmc.estimators.back_propagation or
+                                 afqmc.estimators.calc_itcf),
+                        single_precision_fields=(
+                            afqmc.qmc.single_precision_fields))
     if comm.Get_rank() == 0:
         json.encoder.FLOAT_REPR = lambda o: format(o, '.6f')
         json_string = json.dumps(serialise(afqmc, verbose=1),
@@ -163,13 +170,15 @@ class FakeComm:
         return 1
     def Gather(self, sendbuf, recvbuf, root=0):
         recvbuf[:] = sendbuf
+    def Allgather(self, sendbuf, recvbuf):
+        recvbuf[:] = sendbuf
     def Bcast(self, sendbuf, root=0):
         return sendbuf
     def bcast(self, sendbuf, root=0):
         return sendbuf
-    def isend(self, sendbuf, dest=None, tag=None):
+    def Isend(self, sendbuf, dest=None, tag=None):
         return FakeReq()
-    def recv(self, sendbuf, root=0):
+    def Recv(self, recvbuf, source=None, tag=None):
         pass
     def Reduce(self, sendbuf, recvbuf, op=None):
         recvbuf[:] = sendbuf
@@ -178,5 +187,5 @@ class FakeReq:
 
     def __init__(self):
         pass
-    def wait(self):
+    def Wait(self):
         pass
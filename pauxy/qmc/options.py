@@ -21,10 +21,37 @@ class QMCOpts(object):
         Total number of Monte Carlo steps to perform.
     nmeasure : int
         Frequency of energy measurements.
+    nsample : int
+        Number of steps between accumulating mixed estimates. Default 1, i.e.,
+        every step.
     nstblz : int
         Frequency of Gram-Schmidt orthogonalisation steps.
     npop_control : int
         Frequency of population control.
+    pop_control : string
+        Population control method. Options: `comb`, `pair_branch` or
+        `stochastic_reconfiguration`. Default `comb`.
+    pop_control_min_weight : float
+        Relative weight below which walkers are merged when pair branching.
+    pop_control_max_weight : float
+        Relative weight above which walkers are split when pair branching.
+    ncheckpoint : int
+        Frequency of writing checkpoint file. Default 0, i.e., never.
+    checkpoint : string
+        Checkpoint file name. Default checkpoint.h5.
+    restart : bool
+        Restart calculation from checkpoint file. Default False.
+    write_walkers : bool
+        Write final walker population to output file. Default False.
+    init_walkers : string
+        Output file of previous calculation from which to initialise walkers.
+        Default None.
+    single_precision_fields : bool
+        Store continuous auxiliary fields for back propagation and ITCF
+        estimators in single precision. Default False.
+    nrandom_steps : int
+        Number of steps for which random numbers used to propagate the walkers
+        are generated at once. Default 10.
     temp : float
         Temperature. Currently not used.
     nequilibrate : int
@@ -45,6 +72,8 @@ class QMCOpts(object):
     ffts : boolean
         Use FFTS to diagonalise the kinetic energy propagator? Default False.
         This may speed things up for larger lattices.
+    fft_workers : int
+        Number of threads used for FFTs. Default 1.
 
     Attributes
     ----------
@@ -70,9 +99,24 @@ class QMCOpts(object):
         self.dt = inputs.get('dt', None)
         self.nsteps = inputs.get('nsteps', None)
         self.nmeasure = inputs.get('nmeasure', 10)
+        self.nsample = inputs.get('nsample', 1)
         self.nstblz = inputs.get('nstabilise', 10)
         self.npop_control = inputs.get('npop_control', 10)
+        self.pop_control = inputs.get('pop_control', 'comb')
+        self.pop_control_min_weight = inputs.get('pop_control_min_weight',
+                                                 0.25)
+        self.pop_control_max_weight = inputs.get('pop_control_max_weight',
+                                                 2.0)
         self.nupdate_shift = inputs.get('nupdate_shift', 10)
+        self.ncheckpoint = inputs.get('ncheckpoint', 0)
+        self.checkpoint = inputs.get('checkpoint', 'checkpoint.h5')
+        self.restart = inputs.get('restart', False)
+        self.write_walkers = inputs.get('write_walkers', False)
+        self.init_walkers = inputs.get('init_walkers', None)
+        self.single_precision_fields = inputs.get('single_precision_fields',
+                                                  False)
+        self.nrandom_steps = inputs.get('nrandom_steps', 10)
         self.temp = inputs.get('temperature', None)
         self.nequilibrate = inputs.get('nequilibrate', int(1.0/self.dt))
         self.ffts = inputs.get('kinetic_kspace', False)
+        self.fft_workers = inputs.get('fft_workers', 1)
@@ -152,7 +152,7 @@ def kinetic(t, nbasis, nx, ny, ks):
         Hopping Hamiltonian matrix.
     """
 
-    if ks.all() is None:
+    if ks.ndim == 0:
         T = numpy.zeros((nbasis, nbasis), dtype=float)
     else:
         T = numpy.zeros((nbasis, nbasis), dtype=complex)
@@ -167,19 +167,19 @@ def kinetic(t, nbasis, nx, ny, ks):
             # Take care of periodic boundary conditions
             # there should be a less stupid way of doing this.
             if ny == 1 and dij == [nx-1]:
-                if ks.all() is not None:
+                if ks.ndim > 0:
                     phase = cmath.exp(1j*numpy.dot(cmath.pi*ks,[1]))
                 else:
                     phase = 1.0
                 T[i,j] += -t * phase
             elif (dij==[nx-1, 0]).all():
-                if ks.all() is not None:
+                if ks.ndim > 0:
                     phase = cmath.exp(1j*numpy.dot(cmath.pi*ks,[1,0]))
                 else:
                     phase = 1.0
                 T[i, j] += -t * phase
             elif (dij==[0, ny-1]).all():
-                if ks.all() is not None:
+                if ks.ndim > 0:
                     phase = cmath.exp(1j*numpy.dot(cmath.pi*ks,[0,1]))
                 else:
                     phase = 1.0
@@ -345,7 +345,7 @@ def ek(t, k, kc, ny):
         Number of y lattice points.
     """
     if ny == 1:
-        e = -2.0*t*cos(kc*k)
+        e = -2.0*t*cos(kc[0]*k)
     else:
         e = -2.0*t*(cos(kc[0]*k[0])+cos(kc[1]*k[1]))
 
@@ -1,7 +1,7 @@
 import numpy
 import time
 from pauxy.utils.io import read_fortran_complex_numbers
-from pauxy.utils.linalg import diagonalise_sorted
+from pauxy.utils.linalg import diagonalise_sorted, conjugate_transpose_blocks
 from pauxy.estimators.mixed import gab, local_energy
 
 class FreeElectron(object):
@@ -58,6 +58,10 @@ class FreeElectron(object):
             else:
                 self.psi[:, :system.nup] = self.eigv_up[:, :system.nup]
                 self.psi[:, system.nup:] = self.eigv_dn[:, :system.ndown]
+        # Conjugated trial wavefunction used in every overlap and Green's
+        # function evaluation.
+        self.psi_conj = self.psi.conj()
+        self.psi_H = conjugate_transpose_blocks(self.psi, system.nup)
         gup = gab(self.psi[:, :system.nup],
                                          self.psi[:, :system.nup]).T
         gdown = gab(self.psi[:, system.nup:],
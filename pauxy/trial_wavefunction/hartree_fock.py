@@ -1,6 +1,7 @@
 import numpy
 import time
 from pauxy.estimators.mixed import gab, local_energy
+from pauxy.utils.linalg import conjugate_transpose_blocks
 
 class HartreeFock(object):
 
@@ -19,6 +20,8 @@ class HartreeFock(object):
         occdown = numpy.identity(system.ndown)
         self.psi[:system.nup,:system.nup] = occup
         self.psi[:system.ndown,system.nup:] = occdown
+        self.psi_conj = self.psi.conj()
+        self.psi_H = conjugate_transpose_blocks(self.psi, system.nup)
         gup = gab(self.psi[:,:system.nup],
                                    self.psi[:,:system.nup])
         gdown = gab(self.psi[:,system.nup:], self.psi[:,system.nup:])
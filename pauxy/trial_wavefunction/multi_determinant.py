@@ -64,6 +64,8 @@ class MultiDeterminant(object):
                                         self.GAB, self.weights)
             self.trial = (local_energy_ghf_full(system, self.GAB,
                                                 self.weights)[0].real)
+        self.psi_conj = self.psi.conj()
+        self.psi_H = numpy.ascontiguousarray(self.psi_conj.transpose(0,2,1))
         self.error = False
         self.initialisation_time = time.time() - init_time
         if verbose:
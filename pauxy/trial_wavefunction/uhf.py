@@ -2,7 +2,7 @@ import copy
 import numpy
 import time
 from pauxy.estimators.mixed import gab, local_energy
-from pauxy.utils.linalg import diagonalise_sorted
+from pauxy.utils.linalg import diagonalise_sorted, conjugate_transpose_blocks
 
 class UHF(object):
     r"""UHF trial wavefunction.
@@ -37,6 +37,10 @@ class UHF(object):
     ----------
     psi : :class:`numpy.ndarray`
         Trial wavefunction.
+    psi_conj : :class:`numpy.ndarray`
+        Complex conjugate of trial wavefunction.
+    psi_H : list of :class:`numpy.ndarray`
+        Conjugate transpose of trial wavefunction for each spin.
     eigs : :class:`numpy.array`
         One-electron eigenvalues.
     emin : float
@@ -71,6 +75,8 @@ class UHF(object):
         if self.error and not parallel:
             warnings.warn('Error in constructing trial wavefunction. Exiting')
             sys.exit()
+        self.psi_conj = self.psi.conj()
+        self.psi_H = conjugate_transpose_blocks(self.psi, system.nup)
         Gup = gab(self.psi[:,:system.nup], self.psi[:,:system.nup]).T
         Gdown = gab(self.psi[:,system.nup:], self.psi[:,system.nup:]).T
         self.G = numpy.array([Gup, Gdown])
@@ -1,4 +1,5 @@
 import ast
+import h5py
 import numpy
 
 def format_fixed_width_strings(strings):
@@ -31,3 +32,69 @@ def fcidump_header(nel, norb, spin):
         "&END\n"
     )
     return header
+
+
+def open_distributed_file(comm, filename, mode):
+    """Open HDF5 file to which each processor writes its own data.
+
+    If h5py was built with MPI support the file is opened on all processors
+    using the mpio driver. Otherwise it is only opened on the root processor.
+
+    Parameters
+    ----------
+    comm : MPI communicator
+    filename : string
+        File name.
+    mode : string
+        File mode.
+
+    Returns
+    -------
+    h5f : :class:`h5py.File` or None
+        File object. None on processors which don't open the file.
+    """
+    if comm.size > 1 and h5py.get_config().mpi:
+        return h5py.File(filename, mode, driver='mpio', comm=comm)
+    elif comm.rank == 0:
+        return h5py.File(filename, mode)
+    else:
+        return None
+
+
+def write_distributed_dataset(comm, h5f, name, data, chunks=None):
+    """Write array from all processors to HDF5 dataset.
+
+    The dataset has shape (nprocs,)+data.shape so that each processor's data
+    occupies a contiguous slice which can be read back independently. If the
+    file was opened with the mpio driver each processor writes its own slice.
+    Otherwise the root processor receives and writes one processor's slice at
+    a time, so that the data from all processors is never held in memory at
+    once.
+
+    Parameters
+    ----------
+    comm : MPI communicator
+    h5f : :class:`h5py.File` or None
+        Output file object. Only used on the root processor unless opened with
+        the mpio driver.
+    name : string
+        Dataset name.
+    data : :class:`numpy.ndarray`
+        Contiguous array to write. Must have the same shape and type on all
+        processors.
+    chunks : tuple, optional
+        Chunk shape of dataset.
+    """
+    shape = (comm.size,) + data.shape
+    if h5f is not None and h5f.driver == 'mpio':
+        dset = h5f.create_dataset(name, shape, dtype=data.dtype, chunks=chunks)
+        dset[comm.rank] = data
+    elif comm.rank == 0:
+        dset = h5f.create_dataset(name, shape, dtype=data.dtype, chunks=chunks)
+        dset[0] = data
+        buff = numpy.empty_like(data)
+        for source in range(1, comm.size):
+            comm.Recv(buff, source=source)
+            dset[source] = buff
+    else:
+        comm.Send(numpy.ascontiguousarray(data), dest=0)
@@ -28,6 +28,74 @@ def sherman_morrison(Ainv, u, vt):
     )
 
 
+def inverse_slogdet(A):
+    """Matrix inverse and log determinant.
+
+    A single matrix is factorised once with getrf, which gives the
+    determinant, and then inverted from its LU factors with getri. For a
+    stack of matrices smaller than 32x32 numpy's batched slogdet and inv are
+    used instead. These factorise each matrix twice but avoid the per matrix
+    python overhead, which dominates for small matrices.
+
+    Parameters
+    ----------
+    A : :class:`numpy.ndarray`
+        Square matrix or stack of square matrices of shape (n, N, N).
+
+    Returns
+    -------
+    Ainv : :class:`numpy.ndarray`
+        Matrix inverse.
+    sign : float / complex or :class:`numpy.ndarray`
+        Sign (or phase for complex matrices) of the determinant of A.
+    logdet : float or :class:`numpy.ndarray`
+        Natural log of the absolute value of the determinant of A.
+    """
+    if A.ndim == 3:
+        if A.shape[-1] < 32:
+            (sign, logdet) = numpy.linalg.slogdet(A)
+            return (numpy.linalg.inv(A), sign, logdet)
+        Ainv = numpy.empty_like(A)
+        sign = numpy.empty(A.shape[0], dtype=A.dtype)
+        logdet = numpy.empty(A.shape[0])
+        for (i, a) in enumerate(A):
+            (Ainv[i], sign[i], logdet[i]) = inverse_slogdet(a)
+        return (Ainv, sign, logdet)
+    (getrf, getri) = scipy.linalg.get_lapack_funcs(('getrf', 'getri'), (A,))
+    (lu, piv, info) = getrf(A)
+    if info > 0:
+        raise scipy.linalg.LinAlgError('singular matrix')
+    diag = lu.diagonal()
+    absdiag = numpy.abs(diag)
+    sign = numpy.prod(diag/absdiag)
+    if numpy.count_nonzero(piv != numpy.arange(len(piv))) % 2:
+        sign = -sign
+    logdet = numpy.sum(numpy.log(absdiag))
+    (Ainv, info) = getri(lu, piv, overwrite_lu=True)
+    if info != 0:
+        raise scipy.linalg.LinAlgError('getri failed with info = %d'%info)
+    return (Ainv, sign, logdet)
+
+
+def conjugate_transpose_blocks(psi, nup):
+    r"""Contiguous conjugate transpose of each spin block of a determinant.
+
+    Parameters
+    ----------
+    psi : :class:`numpy.ndarray`
+        Slater determinant of shape (nbasis, ne).
+    nup : int
+        Number of up electrons.
+
+    Returns
+    -------
+    psi_H : list of :class:`numpy.ndarray`
+        :math:`\Psi_\sigma^{\dagger}` of shape (nsigma, nbasis) for each spin.
+    """
+    return [numpy.ascontiguousarray(psi[:,:nup].conj().T),
+            numpy.ascontiguousarray(psi[:,nup:].conj().T)]
+
+
 def diagonalise_sorted(H):
     """Diagonalise Hermitian matrix H and return sorted eigenvalues and vectors.
 
@@ -112,6 +180,27 @@ def reortho(A):
     return (Q, detR)
 
 
+def reortho_batched(A):
+    """Reorthogonalise a stack of MxN matrices.
+
+    Batched version of :func:`reortho`. The QR decompositions of all matrices
+    are performed in a single call.
+
+    Parameters
+    ----------
+    A : :class:`numpy.ndarray`
+        Stack of MxN matrices of shape (nmat, M, N).
+
+    Returns
+    -------
+    Q : :class:`numpy.ndarray`
+        Orthogonal matrices with the signs of the diagonal of R factored in.
+    """
+    (Q, R) = numpy.linalg.qr(A)
+    Q *= numpy.sign(R.diagonal(axis1=-2, axis2=-1))[...,None,:]
+    return Q
+
+
 def modified_cholesky(M, kappa, verbose=False):
     """Modified cholesky decomposition of matrix.
 
@@ -0,0 +1,152 @@
+"""Random number streams for walker propagation."""
+import numpy
+
+
+class RandomStreams(object):
+    """Pre-generated random numbers for a population of walkers.
+
+    Random numbers are drawn from counter based (Philox) generators. The
+    numbers used by a walker on a given step are keyed by the simulation
+    seed, the label of the walker's stream and the step, so they do not depend
+    on how the population is batched or distributed over processors, or on the
+    history of the calculation. Random numbers are generated for nsteps steps
+    at once and copied to the uniform and normal arrays by :meth:`set_step`.
+
+    Parameters
+    ----------
+    seed : int
+        Simulation seed.
+    index : array_like
+        Stream label of each walker. Labels must be unique across all
+        processors.
+    nuniform : int
+        Number of uniform random numbers used by each walker per step.
+    nnormal : int
+        Number of normally distributed random numbers used by each walker per
+        step.
+    nsteps : int
+        Number of steps to generate random numbers for at once.
+
+    Attributes
+    ----------
+    uniform : :class:`numpy.ndarray`
+        Uniform random numbers for the current step. Shape (nwalkers,
+        nuniform).
+    normal : :class:`numpy.ndarray`
+        Normally distributed random numbers for the current step. Shape
+        (nwalkers, nnormal).
+    """
+
+    def __init__(self, seed, index, nuniform, nnormal, nsteps=1):
+        self.seed = seed
+        self.index = numpy.array(index, dtype=numpy.int64)
+        self.nsteps = nsteps
+        nwalkers = len(self.index)
+        self.uniform_block = numpy.zeros(shape=(nwalkers, nsteps, nuniform))
+        self.normal_block = numpy.zeros(shape=(nwalkers, nsteps, nnormal))
+        self.uniform = numpy.zeros(shape=(nwalkers, nuniform))
+        self.normal = numpy.zeros(shape=(nwalkers, nnormal))
+        self.block = None
+        self.step = 0
+
+    def generator(self, index, step, stream=0):
+        """Generator for a given walker and step.
+
+        Parameters
+        ----------
+        index : int
+            Stream label.
+        step : int
+            Iteration number.
+        stream : int
+            Stream label, 0 for walker propagation.
+
+        Returns
+        -------
+        generator : :class:`numpy.random.Generator`
+            Generator keyed by seed and stream label whose counter starts at a
+            position determined by step and stream.
+        """
+        key = numpy.array([self.seed, index], dtype=numpy.uint64)
+        counter = numpy.array([0, 0, step, stream], dtype=numpy.uint64)
+        return numpy.random.Generator(numpy.random.Philox(key=key,
+                                                          counter=counter))
+
+    def generate(self, block):
+        """Generate random numbers for a block of steps.
+
+        Parameters
+        ----------
+        block : int
+            Block index. Random numbers are generated for steps
+            block*nsteps to (block+1)*nsteps-1.
+        """
+        for iw in range(len(self.index)):
+            self.generate_walker(iw, block)
+        self.block = block
+
+    def generate_walker(self, iw, block):
+        """Generate random numbers for a single walker for a block of steps.
+
+        Parameters
+        ----------
+        iw : int
+            Walker index.
+        block : int
+            Block index.
+        """
+        for i in range(self.nsteps):
+            g = self.generator(self.index[iw], block*self.nsteps+i)
+            g.random(out=self.uniform_block[iw,i])
+            g.standard_normal(out=self.normal_block[iw,i])
+
+    def set_index(self, index):
+        """Change walkers' stream labels, e.g., following branching.
+
+        Random numbers for the current block are only regenerated for walkers
+        whose label has changed.
+
+        Parameters
+        ----------
+        index : array_like
+            New stream label of each walker.
+        """
+        index = numpy.asarray(index)
+        changed = numpy.flatnonzero(index != self.index)
+        self.index[:] = index
+        if self.block is not None:
+            for iw in changed:
+                self.generate_walker(iw, self.block)
+
+    def set_step(self, step):
+        """Make random numbers for a given step available.
+
+        Parameters
+        ----------
+        step : int
+            Iteration number.
+        """
+        (block, i) = divmod(step, self.nsteps)
+        if block != self.block:
+            self.generate(block)
+        numpy.copyto(self.uniform, self.uniform_block[:,i])
+        numpy.copyto(self.normal, self.normal_block[:,i])
+        self.step = step
+
+    def shared_uniform(self, n):
+        """Uniform random numbers for the current step common to all walkers.
+
+        Every processor obtains the same numbers, so no communication is
+        required.
+
+        Parameters
+        ----------
+        n : int
+            Number of random numbers.
+
+        Returns
+        -------
+        r : :class:`numpy.ndarray`
+            Uniform random numbers.
+        """
+        return self.generator(0, self.step, stream=1).random(n)
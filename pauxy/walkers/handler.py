@@ -1,9 +1,14 @@
-import copy
+import h5py
 import numpy
 import math
 import scipy.linalg
+import sys
+import warnings
+from pauxy.utils.io import write_distributed_dataset
+from pauxy.utils.rng import RandomStreams
 from pauxy.walkers.multi_ghf import MultiGHFWalker
 from pauxy.walkers.single_det import SingleDetWalker
+from pauxy.walkers.stack import WalkerStack
 
 
 class Walkers(object):
@@ -21,22 +26,87 @@ class Walkers(object):
         Total number of propagators to store for back propagation + itcf.
     nbp : int
         Number of back propagation steps.
+    pop_control : string
+        Population control method. Options: `comb`, `pair_branch` or
+        `stochastic_reconfiguration`. Default `comb`.
+    min_weight : float
+        Walkers with weight below min_weight times the mean weight are merged
+        during pair branching.
+    max_weight : float
+        Walkers with weight above max_weight times the mean weight are split
+        during pair branching.
+    history : bool
+        If true store the historic wavefunctions and auxiliary fields required
+        by back propagation and ITCF estimators. Otherwise walkers'
+        field_configs are None.
+    single_precision_fields : bool
+        If true store continuous auxiliary fields in single precision.
+
+    Attributes
+    ----------
+    walkers : list
+        List of walker objects.
+    stack : :class:`pauxy.walkers.stack.WalkerStack` or None
+        Contiguous storage for single determinant walkers. The arrays of each
+        element of walkers are views into this. None for multi-determinant
+        walkers.
+    field_configs : :class:`FieldConfig` or None
+        Auxiliary field configurations of all walkers. None if history is
+        False.
+    random : :class:`pauxy.utils.rng.RandomStreams` or None
+        Random numbers used to propagate the walkers. Set by
+        :meth:`add_random_streams`.
     """
 
-    def __init__(self, system, trial, nwalkers, nprop_tot, nbp, verbose=False):
+    def __init__(self, system, trial, nwalkers, nprop_tot, nbp, verbose=False,
+                 pop_control='comb', min_weight=0.25, max_weight=2.0,
+                 history=True, single_precision_fields=False):
         if trial.name == 'multi_determinant':
+            self.stack = None
             if trial.type == 'GHF':
                 self.walkers = [MultiGHFWalker(1, system, trial)
                                 for w in range(nwalkers)]
         else:
-            self.walkers = [SingleDetWalker(1, system, trial, w)
+            self.stack = WalkerStack(system, trial.psi.dtype, nwalkers,
+                                     history=history)
+            self.walkers = [SingleDetWalker(1, system, trial, w,
+                                            stack=self.stack)
                             for w in range(nwalkers)]
         if system.name == "Generic":
-            dtype = complex
+            if single_precision_fields:
+                dtype = numpy.complex64
+            else:
+                dtype = numpy.complex128
+        else:
+            dtype = numpy.int8
+        if pop_control == 'pair_branch':
+            self.pop_control = self.pair_branch
+        elif pop_control == 'stochastic_reconfiguration':
+            self.pop_control = self.stochastic_reconfiguration
+        else:
+            if pop_control != 'comb':
+                warnings.warn('Unknown population control method %s. Using '
+                              'comb.'%pop_control)
+            self.pop_control = self.comb
+        self.min_weight = min_weight
+        self.max_weight = max_weight
+        self.random = None
+        if history:
+            self.add_field_config(nprop_tot, nbp, system.nfields, dtype)
         else:
-            dtype = int
-        self.pop_control = self.comb
-        self.add_field_config(nprop_tot, nbp, system.nfields, dtype)
+            self.field_configs = None
+            for w in self.walkers:
+                w.field_configs = None
+        if self.stack is not None:
+            for w in self.walkers:
+                w.init_buffer()
+            self.buffer_size = self.walkers[0].buffer_size
+            # Pools of send and receive buffers, grown as required during
+            # branching.
+            self.send_buffers = numpy.empty(shape=(0, self.buffer_size),
+                                            dtype=numpy.uint8)
+            self.recv_buffers = numpy.empty(shape=(1, self.buffer_size),
+                                            dtype=numpy.uint8)
         self.calculate_total_weight()
         self.calculate_nwalkers()
 
@@ -62,7 +132,7 @@ class Walkers(object):
                 w.weight = detR * w.weight
 
     def add_field_config(self, nprop_tot, nbp, nfields, dtype):
-        """Add FieldConfig object to walker object.
+        """Add population FieldConfig object and a view of it to each walker.
 
         Parameters
         ----------
@@ -75,11 +145,43 @@ class Walkers(object):
         dtype : type
             Field configuration type.
         """
-        for w in self.walkers:
-            w.field_configs = FieldConfig(nfields, nprop_tot, nbp, dtype)
+        self.field_configs = FieldConfig(nfields, nprop_tot, nbp, dtype,
+                                         len(self.walkers))
+        for (iw, w) in enumerate(self.walkers):
+            w.field_configs = WalkerFieldConfig(self.field_configs, iw)
+
+    def add_random_streams(self, seed, nuniform, nnormal, nsteps=1,
+                           offset=0):
+        """Add population random number streams and a view of them to each walker.
+
+        Parameters
+        ----------
+        seed : int
+            Simulation seed.
+        nuniform : int
+            Number of uniform random numbers used by each walker per step.
+        nnormal : int
+            Number of normally distributed random numbers used by each walker
+            per step.
+        nsteps : int
+            Number of steps to generate random numbers for at once.
+        offset : int
+            Stream label of first walker. Walkers are initially labelled by
+            their global index.
+        """
+        for (iw, w) in enumerate(self.walkers):
+            w.stream = offset + iw
+        self.random = RandomStreams(seed, [w.stream for w in self.walkers],
+                                    nuniform, nnormal, nsteps)
+        for (iw, w) in enumerate(self.walkers):
+            w.uniform = self.random.uniform[iw]
+            w.normal = self.random.normal[iw]
 
     def copy_historic_wfn(self):
         """Copy current wavefunction to psi_n for next back propagation step."""
+        if self.stack is not None:
+            numpy.copyto(self.stack.phi_old, self.stack.phi)
+            return
         for (i,w) in enumerate(self.walkers):
             numpy.copyto(self.walkers[i].phi_old, self.walkers[i].phi)
 
@@ -100,9 +202,129 @@ class Walkers(object):
         The definition of the initial wavefunction depends on whether we are
         calculating an ITCF or not.
         """
+        if self.stack is not None:
+            numpy.copyto(self.stack.phi_init, self.stack.phi)
+            return
         for (i,w) in enumerate(self.walkers):
             numpy.copyto(self.walkers[i].phi_init, self.walkers[i].phi)
 
+    def write_checkpoint(self, comm, h5f):
+        """Write walker population to checkpoint file.
+
+        The walker buffers from all processors are written to a dataset of
+        shape (nprocs, nwalkers, buffer_size) with one chunk per walker.
+
+        Parameters
+        ----------
+        comm : MPI communicator
+        h5f : :class:`h5py.File` or None
+            Checkpoint file opened with
+            :func:`pauxy.utils.io.open_distributed_file`.
+        """
+        buffers = numpy.empty(shape=(len(self.walkers), self.buffer_size),
+                              dtype=numpy.uint8)
+        for (w, buff) in zip(self.walkers, buffers):
+            w.get_buffer(buff)
+        write_distributed_dataset(comm, h5f, 'walkers/buffers', buffers,
+                                  chunks=(1, 1, self.buffer_size))
+        if self.field_configs is None:
+            return
+        position = numpy.array([self.field_configs.step,
+                                self.field_configs.block], dtype=numpy.int64)
+        write_distributed_dataset(comm, h5f, 'walkers/field_configs',
+                                  position)
+
+    def read_checkpoint(self, comm, h5f):
+        """Read walker population from checkpoint file.
+
+        Each processor reads its own slice of the walker buffers.
+
+        Parameters
+        ----------
+        comm : MPI communicator
+        h5f : :class:`h5py.File`
+            Checkpoint file.
+        """
+        buffers = h5f['walkers/buffers'][comm.rank]
+        if buffers.shape[-1] != self.buffer_size:
+            if comm.rank == 0:
+                warnings.warn('Walker buffers in checkpoint have size %d, '
+                              'expected %d. Exiting.'%(buffers.shape[-1],
+                                                       self.buffer_size))
+            sys.exit()
+        for (w, buff) in zip(self.walkers, buffers):
+            w.set_buffer(buff)
+        if self.random is not None:
+            self.random.set_index([w.stream for w in self.walkers])
+        if self.field_configs is None:
+            return
+        position = h5f['walkers/field_configs'][comm.rank]
+        (self.field_configs.step,
+         self.field_configs.block) = [int(p) for p in position]
+
+    def write_walkers(self, comm, h5f):
+        """Write walker wavefunctions and weights to output file.
+
+        The population can be used to initialise a subsequent calculation using
+        :meth:`read_walkers`.
+
+        Parameters
+        ----------
+        comm : MPI communicator
+        h5f : :class:`h5py.File` or None
+            Output file. Only used on the root processor.
+        """
+        weights = numpy.array([w.weight for w in self.walkers],
+                              dtype=self.stack.phi.dtype)
+        write_distributed_dataset(comm, h5f, 'walkers/phi', self.stack.phi)
+        write_distributed_dataset(comm, h5f, 'walkers/weights', weights)
+
+    def read_walkers(self, comm, filename, system, trial):
+        """Initialise walkers from population written by a previous calculation.
+
+        The stored population is resampled with a comb to the current number
+        of walkers, which may differ from that of the previous calculation,
+        and walkers' overlaps, Green's functions and local energies are
+        recomputed using the current trial wavefunction. Each processor only
+        reads the wavefunctions of its own walkers.
+
+        Parameters
+        ----------
+        comm : MPI communicator
+        filename : string
+            Output file of previous calculation.
+        system : object
+            System object.
+        trial : object
+            Trial wavefunction object.
+        """
+        with h5py.File(filename, 'r') as h5f:
+            phi = h5f['walkers/phi']
+            if phi.shape[2:] != self.stack.phi.shape[1:]:
+                if comm.rank == 0:
+                    warnings.warn('Walkers in %s have shape %s, expected %s. '
+                                  'Exiting.'%(filename, phi.shape[2:],
+                                              self.stack.phi.shape[1:]))
+                sys.exit()
+            weights = abs(h5f['walkers/weights'][...])
+            nw_old = weights.shape[1]
+            cprobs = numpy.cumsum(weights.ravel())
+            ntarget = len(self.walkers) * comm.size
+            if comm.rank == 0:
+                r = numpy.array([numpy.random.random()])
+            else:
+                r = numpy.empty(1)
+            comm.Bcast(r, root=0)
+            comb = (numpy.arange(ntarget)+r[0]) * cprobs[-1] / ntarget
+            iw = numpy.searchsorted(cprobs, comb, side='right')
+            iw = numpy.minimum(iw, len(cprobs)-1)
+            start = comm.rank * len(self.walkers)
+            for (w, i) in zip(self.walkers, iw[start:]):
+                numpy.copyto(w.phi, phi[divmod(i, nw_old)])
+                w.reset(system, trial)
+        self.calculate_total_weight()
+        self.calculate_nwalkers()
+
     def comb(self, comm):
         """Apply the comb method of population control / branching.
 
@@ -111,80 +333,338 @@ class Walkers(object):
         Parameters
         ----------
         comm : MPI communicator
-        iproc : int
-            Current processor index
-        nprocs : int
-            Total number of mpi processors
         """
-        # Need make a copy to since the elements in psi are only references to
-        # walker objects in memory. We don't want future changes in a given
-        # element of psi having unintended consequences.
-        new_psi = copy.deepcopy(self.walkers)
         # todo : add phase to walker for free projection
         weights = numpy.array([abs(w.weight) for w in self.walkers])
-        global_weights = numpy.zeros(len(weights)*comm.size)
-        if comm.rank == 0:
-            parent_ix = numpy.zeros(len(global_weights), dtype='i')
+        streams = numpy.array([w.stream for w in self.walkers])
+        ncopies = self.comb_copies(comm, weights, streams, self.nw*comm.size)
+        self.redistribute(comm, ncopies, streams)
+        # Reset walker weight.
+        for w in self.walkers:
+            w.weight = 1.0
+
+    def stochastic_reconfiguration(self, comm):
+        """Apply fixed population stochastic reconfiguration.
+
+        Walkers on each processor are resampled with a comb using only the
+        local walker weights, and each walker is then assigned the mean weight
+        of its processor's walkers so that the total weight on each processor
+        is conserved. Walkers are never communicated.
+
+        See Calandra Buonaura & Sorella PRB 57, 11446 (1998).
+
+        Parameters
+        ----------
+        comm : MPI communicator
+        """
+        weights = numpy.array([abs(w.weight) for w in self.walkers])
+        cprobs = numpy.cumsum(weights)
+        nw = len(weights)
+        comb = (numpy.arange(nw)+numpy.random.random()) * cprobs[-1] / nw
+        iw = numpy.searchsorted(cprobs, comb, side='right')
+        iw = numpy.minimum(iw, nw-1)
+        self.replace_killed(numpy.bincount(iw, minlength=nw))
+        weights[:] = cprobs[-1] / nw
+        self.normalise_weights(comm, weights)
+
+    def pair_branch(self, comm):
+        """Apply pair branching population control.
+
+        Walkers whose weight exceeds max_weight times the mean weight are
+        paired with those whose weight is below min_weight times the mean.
+        For each pair one walker, chosen with probability proportional to its
+        weight, replaces the other and both are assigned half the pair's total
+        weight. Walkers are only paired with others on the same processor so
+        walkers are never communicated.
+
+        See Wagner, Bajdich & Mitas J. Comp. Phys. 228, 3390 (2009).
+
+        Parameters
+        ----------
+        comm : MPI communicator
+        """
+        weights = numpy.array([abs(w.weight) for w in self.walkers])
+        mean = numpy.mean(weights)
+        order = numpy.argsort(weights)
+        small = order[weights[order] < self.min_weight*mean]
+        order = order[::-1]
+        large = order[weights[order] > self.max_weight*mean]
+        npairs = min(len(small), len(large))
+        small = small[:npairs]
+        large = large[:npairs]
+        pair_weights = weights[small] + weights[large]
+        keep_large = numpy.random.random(npairs)*pair_weights < weights[large]
+        source = numpy.where(keep_large, large, small)
+        dest = numpy.where(keep_large, small, large)
+        buff = self.recv_buffers[0]
+        for (s, d) in zip(source, dest):
+            self.walkers[s].get_buffer(buff)
+            self.walkers[d].set_buffer(buff)
+        weights[small] = 0.5 * pair_weights
+        weights[large] = 0.5 * pair_weights
+        self.normalise_weights(comm, weights)
+
+    def normalise_weights(self, comm, weights):
+        """Set walker weights rescaled so that the mean weight is unity.
+
+        Population control methods which conserve the walker weights would
+        otherwise see them drift exponentially with the mismatch between the
+        trial energy and the population's growth. Only the total weight on
+        each processor is communicated.
+
+        Parameters
+        ----------
+        comm : MPI communicator
+        weights : :class:`numpy.ndarray`
+            New weights of walkers on this processor.
+        """
+        local_weight = numpy.array([sum(weights)])
+        proc_weights = numpy.zeros(comm.size)
+        comm.Allgather(local_weight, proc_weights)
+        weights = weights * self.nw * comm.size / sum(proc_weights)
+        for (w, weight) in zip(self.walkers, weights):
+            w.weight = weight
+
+    def comb_copies(self, comm, weights, streams, ntarget):
+        """Find number of copies of each walker selected by the comb.
+
+        The comb is placed over the cumulative weight of the population
+        ordered by the walkers' stream labels, so the walkers selected do not
+        depend on how the population is distributed over processors. Only the
+        weight and label of each walker are communicated.
+
+        Parameters
+        ----------
+        comm : MPI communicator
+        weights : :class:`numpy.ndarray`
+            Weights of walkers on this processor.
+        streams : :class:`numpy.ndarray`
+            Stream labels of walkers on this processor.
+        ntarget : int
+            Total number of walkers to select across all processors.
+
+        Returns
+        -------
+        ncopies : :class:`numpy.ndarray`
+            Number of copies of each walker in the population indexed by
+            stream label.
+        """
+        proc_weights = numpy.zeros(comm.size*len(weights))
+        proc_streams = numpy.zeros(comm.size*len(streams), dtype=streams.dtype)
+        comm.Allgather(weights, proc_weights)
+        comm.Allgather(streams, proc_streams)
+        population = numpy.zeros(len(proc_weights))
+        population[proc_streams] = proc_weights
+        cprobs = numpy.cumsum(population)
+        if self.random is not None:
+            r = self.random.shared_uniform(1)[0]
         else:
-            parent_ix = numpy.empty(len(global_weights), dtype='i')
-
-        comm.Gather(weights, global_weights, root=0)
-        if comm.rank == 0:
-            total_weight = sum(global_weights)
-            cprobs = numpy.cumsum(global_weights)
-            ntarget = self.nw * comm.size
-
-            r = numpy.random.random()
-            comb = [(i+r) * (total_weight/(ntarget)) for i in range(ntarget)]
-            iw = 0
-            ic = 0
-            while ic < len(comb):
-                if comb[ic] < cprobs[iw]:
-                    parent_ix[iw] += 1
-                    ic += 1
-                else:
-                    iw += 1
-
-        # Wait for master
-        comm.Bcast(parent_ix, root=0)
-        # Copy back new information
-        send = []
-        recv = []
-        for (i, w) in enumerate(parent_ix):
-            # processor index of killed walker
-            if w == 0:
-                recv.append([i//self.nw, i%self.nw])
-            elif w > 1:
-                for ns in range(0, w-1):
-                    send.append([i//self.nw, i%self.nw])
+            if comm.rank == 0:
+                r = numpy.array([numpy.random.random()])
+            else:
+                r = numpy.empty(1)
+            comm.Bcast(r, root=0)
+            r = r[0]
+        spacing = cprobs[-1] / ntarget
+        comb = (numpy.arange(ntarget)+r) * spacing
+        # Each tooth selects the first walker whose cumulative weight
+        # exceeds it.
+        iw = numpy.searchsorted(cprobs, comb, side='right')
+        iw = numpy.minimum(iw, len(cprobs)-1)
+        return numpy.bincount(iw, minlength=len(cprobs))
+
+    def redistribute(self, comm, ncopies, streams):
+        """Redistribute walkers following branching.
+
+        Walkers selected by the comb keep their walker slot. Surplus copies of
+        duplicated walkers first replace killed walkers on the same processor.
+        The remaining surplus is moved from processors with too many walkers
+        to those with too few, with all walkers going to the same processor
+        packed into a single message, see :func:`match_transfers`. Only the
+        per processor surplus is communicated globally.
+
+        Each copy takes the stream label of a killed walker: ordering both
+        the surplus copies and killed walkers by label, the j-th copy takes
+        the label of the j-th killed walker. The labelled population, and so
+        the random numbers used to propagate it, therefore do not depend on
+        the number of processors, although walkers' slots do.
+
+        Parameters
+        ----------
+        comm : MPI communicator
+        ncopies : :class:`numpy.ndarray`
+            Number of copies of each walker in the population indexed by
+            stream label.
+        streams : :class:`numpy.ndarray`
+            Stream labels of walkers on this processor.
+        """
+        extra = numpy.maximum(ncopies-1, 0)
+        first = numpy.cumsum(extra) - extra
+        killed_streams = numpy.flatnonzero(ncopies == 0)
+        local = ncopies[streams]
+        nextra = numpy.maximum(local-1, 0)
+        surplus = numpy.repeat(numpy.arange(len(local)), nextra)
+        # Stream labels of copies, offsetting each walker's first copy by its
+        # position amongst its own copies.
+        copy = (numpy.arange(len(surplus)) -
+                numpy.repeat(numpy.cumsum(nextra)-nextra, nextra))
+        labels = killed_streams[first[streams[surplus]]+copy]
+        killed = numpy.flatnonzero(local == 0)
+        # A walker is either a parent or killed, never both, so parents can be
+        # read directly while killed walkers are overwritten and we don't need
+        # to copy the population beforehand.
+        nlocal = min(len(surplus), len(killed))
+        buff = self.recv_buffers[0]
+        for (s, k, l) in zip(surplus[:nlocal], killed[:nlocal],
+                             labels[:nlocal]):
+            self.walkers[s].get_buffer(buff)
+            self.walkers[k].set_buffer(buff)
+            self.walkers[k].stream = l
+        surplus = surplus[nlocal:]
+        labels = labels[nlocal:]
+        killed = killed[nlocal:]
+        excess = numpy.array([len(surplus)-len(killed)], dtype='i')
+        proc_excess = numpy.zeros(comm.size, dtype='i')
+        comm.Allgather(excess, proc_excess)
+        (donors, receivers, counts) = match_transfers(proc_excess)
         # Send / Receive walkers.
+        self.send_buffers = grow_buffer(self.send_buffers, len(surplus))
+        self.recv_buffers = grow_buffer(self.recv_buffers, len(killed))
         reqs = []
-        reqr = []
-        walker_buffers = []
-        for i, (s,r) in enumerate(zip(send, recv)):
+        start = 0
+        for (dest, n) in zip(receivers[donors==comm.rank],
+                             counts[donors==comm.rank]):
             # don't want to access buffer during non-blocking send.
-            if (comm.rank == s[0]):
-                # Sending duplicated walker
-                walker_buffers.append(new_psi[s[1]].get_buffer())
-                reqs.append(comm.isend(walker_buffers[-1],
-                            dest=r[0], tag=i))
-        for i, (s,r) in enumerate(zip(send, recv)):
-            if str(comm.__class__) == 'pauxy.qmc.calc.FakeComm':
-                # no mpi4py
-                walker_buffer = walker_buffers[i]
-            else:
-                if (comm.rank == r[0]):
-                    walker_buffer = comm.recv(source=s[0], tag=i)
-                    self.walkers[r[1]].set_buffer(walker_buffer)
+            buff = self.send_buffers[start:start+n]
+            for (b, s, l) in zip(buff, surplus[start:start+n],
+                                 labels[start:start+n]):
+                self.pack_copy(s, l, b)
+            reqs.append(comm.Isend(buff, dest=int(dest)))
+            start += n
+        start = 0
+        for (source, n) in zip(donors[receivers==comm.rank],
+                               counts[receivers==comm.rank]):
+            buff = self.recv_buffers[:n]
+            comm.Recv(buff, source=int(source))
+            for (b, k) in zip(buff, killed[start:start+n]):
+                self.walkers[k].set_buffer(b)
+            start += n
         for rs in reqs:
-            rs.wait()
+            rs.Wait()
         comm.Barrier()
-        # Reset walker weight.
-        for w in self.walkers:
-            w.weight = 1.0
+        if self.random is not None:
+            self.random.set_index([w.stream for w in self.walkers])
+
+    def pack_copy(self, iw, stream, buff):
+        """Pack copy of walker with a new stream label into buffer.
+
+        Parameters
+        ----------
+        iw : int
+            Index of walker to copy.
+        stream : int
+            Stream label of copy.
+        buff : :class:`numpy.ndarray`
+            Walker buffer.
+        """
+        walker = self.walkers[iw]
+        parent = walker.stream
+        walker.stream = stream
+        walker.get_buffer(buff)
+        walker.stream = parent
+
+    def replace_killed(self, ncopies):
+        """Replace killed walkers with surplus copies on the same processor.
+
+        Parameters
+        ----------
+        ncopies : :class:`numpy.ndarray`
+            Number of copies of each walker on this processor to keep.
+
+        Returns
+        -------
+        surplus : :class:`numpy.ndarray`
+            Indices of walkers with copies still to be placed, repeated for
+            each copy.
+        killed : :class:`numpy.ndarray`
+            Indices of killed walkers which have not been replaced.
+        """
+        # A walker is either a parent or killed, never both, so parents can be
+        # read directly while killed walkers are overwritten and we don't need
+        # to copy the population beforehand.
+        surplus = numpy.repeat(numpy.arange(len(ncopies)),
+                               numpy.maximum(ncopies-1, 0))
+        killed = numpy.flatnonzero(ncopies == 0)
+        nlocal = min(len(surplus), len(killed))
+        buff = self.recv_buffers[0]
+        for (s, k) in zip(surplus[:nlocal], killed[:nlocal]):
+            self.walkers[s].get_buffer(buff)
+            self.walkers[k].set_buffer(buff)
+        return (surplus[nlocal:], killed[nlocal:])
+
+
+def match_transfers(excess):
+    """Match processors with surplus walkers to those with a deficit.
+
+    The surplus and deficit processors are laid out along two number lines
+    using prefix sums of their excess. Each overlapping segment of the two
+    lines is one transfer, so at most ndonors+nreceivers-1 messages are
+    needed.
+
+    Parameters
+    ----------
+    excess : :class:`numpy.ndarray`
+        Surplus (positive) or deficit (negative) of walkers on each processor.
+        Must sum to zero.
+
+    Returns
+    -------
+    donors : :class:`numpy.ndarray`
+        Sending processor for each transfer.
+    receivers : :class:`numpy.ndarray`
+        Receiving processor for each transfer.
+    counts : :class:`numpy.ndarray`
+        Number of walkers in each transfer.
+    """
+    donors = numpy.flatnonzero(excess > 0)
+    receivers = numpy.flatnonzero(excess < 0)
+    supply = numpy.cumsum(excess[donors])
+    demand = numpy.cumsum(-excess[receivers])
+    bounds = numpy.union1d(supply, demand)
+    counts = numpy.diff(bounds, prepend=0)
+    return (donors[numpy.searchsorted(supply, bounds)],
+            receivers[numpy.searchsorted(demand, bounds)],
+            counts)
+
+
+def grow_buffer(buff, nrows):
+    """Grow pool of walker buffers if it has fewer than nrows buffers.
+
+    Parameters
+    ----------
+    buff : :class:`numpy.ndarray`
+        Pool of walker buffers of shape (nbuffers, buffer_size).
+    nrows : int
+        Number of buffers required.
+
+    Returns
+    -------
+    buff : :class:`numpy.ndarray`
+        Pool of at least nrows walker buffers.
+    """
+    if nrows > len(buff):
+        buff = numpy.empty(shape=(nrows, buff.shape[1]), dtype=buff.dtype)
+    return buff
+
 
 class FieldConfig(object):
-    """Object for managing stored auxilliary field.
+    """Ring buffer of auxiliary field configurations for the walker population.
+
+    Fields are stored in arrays indexed by (walker, step, field). Propagators
+    write each walker's fields for the current step to next_configs (and
+    next_cos_fac / next_weight_fac), which are copied to the buffer for the
+    whole population at once by :meth:`push`. All walkers share the same
+    position in the buffer.
 
     Parameters
     ----------
@@ -195,40 +675,101 @@ class FieldConfig(object):
     nbp : int
         Number of back propagation steps.
     dtype : type
-        Field configuration type.
+        Field configuration type used for storage.
+    nwalkers : int
+        Number of walkers.
+
+    Attributes
+    ----------
+    configs : :class:`numpy.ndarray`
+        Stored fields. Shape (nwalkers, nprop_tot, nfields).
+    cos_fac : :class:`numpy.ndarray`
+        Stored cosine factors. Shape (nwalkers, nprop_tot, 1).
+    weight_fac : :class:`numpy.ndarray`
+        Stored weight factors. Shape (nwalkers, nprop_tot, 1).
     """
-    def __init__(self, nfields, nprop_tot, nbp, dtype):
-        self.configs = numpy.zeros(shape=(nprop_tot, nfields), dtype=dtype)
-        self.cos_fac = numpy.zeros(shape=(nprop_tot, 1), dtype=float)
-        self.weight_fac = numpy.zeros(shape=(nprop_tot, 1), dtype=complex)
+    def __init__(self, nfields, nprop_tot, nbp, dtype, nwalkers=1):
+        self.configs = numpy.zeros(shape=(nwalkers, nprop_tot, nfields),
+                                   dtype=dtype)
+        self.cos_fac = numpy.zeros(shape=(nwalkers, nprop_tot, 1),
+                                   dtype=float)
+        self.weight_fac = numpy.zeros(shape=(nwalkers, nprop_tot, 1),
+                                      dtype=complex)
+        self.next_configs = numpy.zeros(shape=(nwalkers, nfields),
+                                        dtype=dtype)
+        self.next_cos_fac = numpy.zeros(shape=(nwalkers, 1), dtype=float)
+        self.next_weight_fac = numpy.zeros(shape=(nwalkers, 1), dtype=complex)
         self.step = 0
         # need to account for first iteration and how we iterate
         self.block = -1
-        self.ib = 0
         self.nfields = nfields
         self.nbp = nbp
         self.nprop_tot = nprop_tot
         self.nblock = nprop_tot // nbp
 
-    def push(self, config):
-        """Add field configuration to buffer.
+    def push(self):
+        """Add current field configurations of all walkers to buffer."""
+        self.configs[:,self.step] = self.next_configs
+        self.cos_fac[:,self.step] = self.next_cos_fac
+        self.weight_fac[:,self.step] = self.next_weight_fac
+        self.step = (self.step + 1) % self.nprop_tot
+        # Completed this block of back propagation steps?
+        if self.step % self.nbp == 0:
+            self.block = (self.block + 1) % self.nblock
+
+    def get_block(self, iw):
+        """Return a view to current block for back propagation.
 
         Parameters
         ----------
-        config : int
-            Auxilliary field configuration.
+        iw : int
+            Walker index.
+        """
+        start = self.block * self.nbp
+        end = (self.block + 1) * self.nbp
+        return (self.configs[iw,start:end], self.cos_fac[iw,start:end],
+                self.weight_fac[iw,start:end])
+
+    def get_superblock(self, iw):
+        """Return a view to current super block for ITCF.
+
+        Parameters
+        ----------
+        iw : int
+            Walker index.
         """
-        self.configs[self.step, self.ib] = config
-        self.ib = (self.ib + 1) % self.nfields
-        # Completed field configuration for this walker?
-        if self.ib == 0:
-            self.step = (self.step + 1) % self.nprop_tot
-            # Completed this block of back propagation steps?
-            if self.step % self.nbp == 0:
-                self.block = (self.block + 1) % self.nblock
+        end = self.nprop_tot - self.nbp
+        return (self.configs[iw,:end], self.cos_fac[iw,:end],
+                self.weight_fac[iw,:end])
+
+
+class WalkerFieldConfig(object):
+    """A single walker's view of the population's field configurations.
+
+    Parameters
+    ----------
+    field_configs : :class:`FieldConfig`
+        Population field configurations.
+    index : int
+        Walker index.
+
+    Attributes
+    ----------
+    configs : :class:`numpy.ndarray`
+        Walker's stored fields. View of field_configs.configs.
+    next_configs : :class:`numpy.ndarray`
+        Walker's fields for the current step, filled in by the propagator.
+    """
+    def __init__(self, field_configs, index):
+        self.field_configs = field_configs
+        self.index = index
+        self.configs = field_configs.configs[index]
+        self.cos_fac = field_configs.cos_fac[index]
+        self.weight_fac = field_configs.weight_fac[index]
+        self.next_configs = field_configs.next_configs[index]
 
     def push_full(self, config, cfac, wfac):
-        """Add full field configuration for walker to buffer.
+        """Set full field configuration for walker for the current step.
 
         Parameters
         ----------
@@ -240,23 +781,14 @@ class FieldConfig(object):
             Weight factor to restore full walker weight following phaseless
             approximation.
         """
-        self.configs[self.step] = config
-        self.cos_fac[self.step] = cfac
-        self.weight_fac[self.step] = wfac
-        # Completed field configuration for this walker?
-        self.step = (self.step + 1) % self.nprop_tot
-        # Completed this block of back propagation steps?
-        if self.step % self.nbp == 0:
-            self.block = (self.block + 1) % self.nblock
+        self.next_configs[:] = config
+        self.field_configs.next_cos_fac[self.index] = cfac
+        self.field_configs.next_weight_fac[self.index] = wfac
 
     def get_block(self):
         """Return a view to current block for back propagation."""
-        start = self.block * self.nbp
-        end = (self.block + 1) * self.nbp
-        return (self.configs[start:end], self.cos_fac[start:end],
-                self.weight_fac[start:end])
+        return self.field_configs.get_block(self.index)
 
     def get_superblock(self):
         """Return a view to current super block for ITCF."""
-        end = self.nprop_tot - self.nbp
-        return (self.configs[:end], self.cos_fac[:end], self.weight_fac[:end])
+        return self.field_configs.get_superblock(self.index)
@@ -54,7 +54,7 @@ class MultiGHFWalker(object):
         else:
             self.weights = numpy.ones(trial.ndets, dtype=trial.psi.dtype)
         if wfn0 != 'GHF':
-            self.inverse_overlap(trial.psi)
+            self.inverse_overlap(trial.psi_H)
         # Green's functions for various elements of the trial wavefunction.
         self.Gi = numpy.zeros(shape=(trial.ndets, 2*system.nbasis,
                                      2*system.nbasis), dtype=self.phi.dtype)
@@ -81,19 +81,17 @@ class MultiGHFWalker(object):
         # Historic wavefunction for ITCF.
         self.phi_bp = copy.deepcopy(trial.psi)
 
-    def inverse_overlap(self, trial):
+    def inverse_overlap(self, trial_H):
         """Compute inverse overlap matrix from scratch.
 
         Parameters
         ----------
-        trial : :class:`numpy.ndarray`
-            Trial wavefunction.
+        trial_H : :class:`numpy.ndarray`
+            Conjugate transpose of each determinant in the trial wavefunction.
         """
         nup = self.nup
-        for (indx, t) in enumerate(trial):
-            self.inv_ovlp[indx,:,:] = (
-                scipy.linalg.inv((t.conj()).T.dot(self.phi))
-            )
+        for (indx, t) in enumerate(trial_H):
+            self.inv_ovlp[indx,:,:] = scipy.linalg.inv(t.dot(self.phi))
 
     def calc_otrial(self, trial):
         """Caculate overlap with trial wavefunction.
@@ -162,7 +160,7 @@ class MultiGHFWalker(object):
         drup = scipy.linalg.det(signs_up.dot(Rup))
         drdn = scipy.linalg.det(signs_down.dot(Rdown))
         detR = drup * drdn
-        self.inverse_overlap(trial.psi)
+        self.inverse_overlap(trial.psi_H)
         self.ot = self.calc_otrial(trial)
 
     def greens_function(self, trial):
@@ -174,11 +172,9 @@ class MultiGHFWalker(object):
             Trial wavefunction object.
         """
         nup = self.nup
-        for (ix, t) in enumerate(trial.psi):
+        for (ix, t) in enumerate(trial.psi_H):
             # construct "local" green's functions for each component of psi_T
-            self.Gi[ix,:,:] = (
-                (self.phi.dot(self.inv_ovlp[ix]).dot(t.conj().T)).T
-            )
+            self.Gi[ix,:,:] = (self.phi.dot(self.inv_ovlp[ix]).dot(t)).T
         denom = sum(self.weights)
         self.G = numpy.einsum('i,ijk->jk', self.weights, self.Gi) / denom
 
@@ -197,10 +193,8 @@ class MultiGHFWalker(object):
             Basis index.
         """
         nup = self.nup
-        for (indx, t) in enumerate(trial.psi):
-            self.inv_ovlp[indx,:,:] = (
-                scipy.linalg.inv((t.conj()).T.dot(self.phi))
-            )
+        for (indx, t) in enumerate(trial.psi_H):
+            self.inv_ovlp[indx,:,:] = scipy.linalg.inv(t.dot(self.phi))
 
     def local_energy(self, system):
         """Compute walkers local energy
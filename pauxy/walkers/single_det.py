@@ -1,9 +1,9 @@
-import copy
 import numpy
 import scipy.linalg
 from pauxy.estimators.mixed import local_energy
 from pauxy.trial_wavefunction.free_electron import FreeElectron
-from pauxy.utils.linalg import sherman_morrison
+from pauxy.utils.linalg import sherman_morrison, inverse_slogdet
+from pauxy.walkers.stack import WalkerStack
 
 class SingleDetWalker(object):
     """UHF style walker.
@@ -17,29 +17,35 @@ class SingleDetWalker(object):
     trial : object
         Trial wavefunction object.
     index : int
-        Element of trial wavefunction to initalise walker to.
+        Element of trial wavefunction to initalise walker to. If stack is not
+        None this is also the walker's slot in the stack.
+    stack : :class:`pauxy.walkers.stack.WalkerStack`
+        Contiguous storage for walker population. The walker's arrays are
+        views into this. If None the walker allocates its own storage, without
+        historic wavefunctions.
     """
 
-    def __init__(self, weight, system, trial, index=0):
+    def __init__(self, weight, system, trial, index=0, stack=None):
         self.weight = weight
         self.alive = 1
-        if trial.initial_wavefunction == 'free_electron':
-            self.phi = numpy.zeros(shape=(system.nbasis,system.ne),
-                                   dtype=trial.psi.dtype)
-            tmp = FreeElectron(system, system.ktwist.all() != None, {})
-            self.phi[:,:system.nup] = tmp.psi[:,:system.nup]
-            self.phi[:,system.nup:] = tmp.psi[:,system.nup:]
-        else:
-            self.phi = copy.deepcopy(trial.psi)
-        self.inv_ovlp = [0, 0]
+        # Label of walker's random number stream. Copies made during
+        # branching are given new labels.
+        self.stream = index
+        if stack is None:
+            stack = WalkerStack(system, trial.psi.dtype, 1, history=False)
+            index = 0
+        self.phi = stack.phi[index]
+        numpy.copyto(self.phi, initial_wavefunction(system, trial))
+        self.inv_ovlp = [stack.inv_ovlp[0][index], stack.inv_ovlp[1][index]]
         self.nup = system.nup
-        self.inverse_overlap(trial.psi)
-        self.G = numpy.zeros(shape=(2, system.nbasis, system.nbasis),
-                             dtype=trial.psi.dtype)
-        self.Gmod = numpy.zeros(shape=(2, system.nbasis, system.nup),
-                                dtype=trial.psi.dtype)
+        self.inverse_overlap(trial.psi_H)
+        self.G = stack.G[index]
+        self.Gmod = stack.Gmod[index]
         self.greens_function(trial)
-        self.ot = 1.0
+        # Overlap with trial wavefunction stored as sign (phase) and log of
+        # magnitude to avoid overflow.
+        self.ot_sign = 1.0
+        self.log_ot = 0.0
         # interface consistency
         self.ots = numpy.zeros(1)
         self.E_L = local_energy(system, self.G)[0].real
@@ -47,29 +53,81 @@ class SingleDetWalker(object):
         self.ot_bp = 1.0
         # walkers weight at time tau before backpropagation occurs
         self.weight_bp = weight
-        # Historic wavefunction for back propagation.
-        self.phi_old = copy.deepcopy(self.phi)
-        # Historic wavefunction for ITCF.
-        self.phi_init = copy.deepcopy(self.phi)
-        # Historic wavefunction for ITCF.
-        self.phi_bp = copy.deepcopy(self.phi)
+        if stack.phi_old is not None:
+            # Historic wavefunction for back propagation.
+            self.phi_old = stack.phi_old[index]
+            # Historic wavefunction for ITCF.
+            self.phi_init = stack.phi_init[index]
+            # Historic wavefunction for ITCF.
+            self.phi_bp = stack.phi_bp[index]
+        else:
+            self.phi_old = None
+            self.phi_init = None
+            self.phi_bp = None
+        self.reset_historic_wfn()
         self.weights = numpy.array([1])
+        # Only allocated if back propagation or ITCF estimators are used.
+        self.field_configs = None
+
+    def reset(self, system, trial):
+        """Recompute walker's overlap, Green's function and local energy.
+
+        Used when the walker's wavefunction has been set externally, e.g., from
+        a previous calculation. The walker's weight is set to unity.
+
+        Parameters
+        ----------
+        system : object
+            System object.
+        trial : object
+            Trial wavefunction object.
+        """
+        self.weight = 1.0
+        self.weight_bp = 1.0
+        (self.ot_sign, self.log_ot) = self.inverse_overlap(trial.psi_H)
+        self.greens_function(trial)
+        self.ot_bp = self.ot
+        self.E_L = local_energy(system, self.G)[0].real
+        self.reset_historic_wfn()
 
-    def inverse_overlap(self, trial):
+    def reset_historic_wfn(self):
+        """Set historic wavefunctions to current wavefunction if allocated."""
+        if self.phi_old is not None:
+            numpy.copyto(self.phi_old, self.phi)
+            numpy.copyto(self.phi_init, self.phi)
+            numpy.copyto(self.phi_bp, self.phi)
+
+    @property
+    def ot(self):
+        """Overlap with trial wavefunction."""
+        return self.ot_sign * numpy.exp(self.log_ot)
+
+    def inverse_overlap(self, trial_H):
         """Compute inverse overlap matrix from scratch.
 
+        The overlap matrix is factorised once per spin to give both its inverse
+        and determinant.
+
         Parameters
         ----------
-        trial : :class:`numpy.ndarray`
-            Trial wavefunction.
+        trial_H : list of :class:`numpy.ndarray`
+            Conjugate transpose of trial wavefunction for each spin.
+
+        Returns
+        -------
+        ot_sign : float / complex
+            Sign (or phase) of overlap with trial wavefunction.
+        log_ot : float
+            Log of magnitude of overlap with trial wavefunction.
         """
         nup = self.nup
-        self.inv_ovlp[0] = (
-            scipy.linalg.inv((trial[:,:nup].conj()).T.dot(self.phi[:,:nup]))
+        (self.inv_ovlp[0][:], sup, lup) = (
+            inverse_slogdet(trial_H[0].dot(self.phi[:,:nup]))
         )
-        self.inv_ovlp[1] = (
-            scipy.linalg.inv((trial[:,nup:].conj()).T.dot(self.phi[:,nup:]))
+        (self.inv_ovlp[1][:], sdn, ldn) = (
+            inverse_slogdet(trial_H[1].dot(self.phi[:,nup:]))
         )
+        return (sup*sdn, lup+ldn)
 
     def update_inverse_overlap(self, trial, vtup, vtdown, i):
         """Update inverse overlap matrix given a single row update of walker.
@@ -86,11 +144,11 @@ class SingleDetWalker(object):
             Basis index.
         """
         nup = self.nup
-        self.inv_ovlp[0] = (
-            sherman_morrison(self.inv_ovlp[0], trial.psi[i,:nup].conj(), vtup)
+        self.inv_ovlp[0][:] = (
+            sherman_morrison(self.inv_ovlp[0], trial.psi_conj[i,:nup], vtup)
         )
-        self.inv_ovlp[1] = (
-            sherman_morrison(self.inv_ovlp[1], trial.psi[i,nup:].conj(), vtdown)
+        self.inv_ovlp[1][:] = (
+            sherman_morrison(self.inv_ovlp[1], trial.psi_conj[i,nup:], vtdown)
         )
 
     def calc_otrial(self, trial):
@@ -122,7 +180,9 @@ class SingleDetWalker(object):
         coeffs : :class:`numpy.ndarray`
             Trial wavefunction coefficients. For interface consistency.
         """
-        self.ot = 2 * self.ot * probs[xi]
+        ratio = 2 * probs[xi]
+        self.ot_sign *= ratio / abs(ratio)
+        self.log_ot += numpy.log(abs(ratio))
 
     def reortho(self, trial):
         """reorthogonalise walker.
@@ -141,11 +201,13 @@ class SingleDetWalker(object):
         signs_down = numpy.diag(numpy.sign(numpy.diag(Rdown)))
         self.phi[:,:nup] = self.phi[:,:nup].dot(signs_up)
         self.phi[:,nup:] = self.phi[:,nup:].dot(signs_down)
-        drup = scipy.linalg.det(signs_up.dot(Rup))
-        drdn = scipy.linalg.det(signs_down.dot(Rdown))
-        detR = drup * drdn
-        self.ot = self.ot / detR
-        return detR
+        # det(R) is real and positive after absorbing signs into Q.
+        log_detR = (numpy.sum(numpy.log(numpy.abs(numpy.diag(Rup)))) +
+                    numpy.sum(numpy.log(numpy.abs(numpy.diag(Rdown)))))
+        self.log_ot -= log_detR
+        # detR is only used with free projection, where it may overflow.
+        with numpy.errstate(over='ignore'):
+            return numpy.exp(log_detR)
 
     def greens_function(self, trial):
         """Compute walker's green's function.
@@ -156,13 +218,9 @@ class SingleDetWalker(object):
             Trial wavefunction object.
         """
         nup = self.nup
-        t = trial.psi
-        self.G[0] = (
-            (self.phi[:,:nup].dot(self.inv_ovlp[0]).dot(t[:,:nup].conj().T)).T
-        )
-        self.G[1] = (
-            (self.phi[:,nup:].dot(self.inv_ovlp[1]).dot(t[:,nup:].conj().T)).T
-        )
+        t = trial.psi_H
+        self.G[0] = (self.phi[:,:nup].dot(self.inv_ovlp[0]).dot(t[0])).T
+        self.G[1] = (self.phi[:,nup:].dot(self.inv_ovlp[1]).dot(t[1])).T
 
     def rotated_greens_function(self):
         """Compute "rotated" walker's green's function.
@@ -193,49 +251,122 @@ class SingleDetWalker(object):
         """
         return local_energy(system, self.G)
 
-    def get_buffer(self):
+    def buffer_arrays(self):
+        """Arrays packed into walker buffer for MPI communication.
+
+        Returns
+        -------
+        arrays : list of :class:`numpy.ndarray`
+            Walker arrays in the order they appear in the buffer.
+        """
+        arrays = [self.phi, self.inv_ovlp[0], self.inv_ovlp[1], self.G,
+                  self.ots]
+        if self.phi_old is not None:
+            arrays += [self.phi_old, self.phi_init, self.phi_bp]
+        if self.field_configs is not None:
+            arrays += [self.field_configs.configs, self.field_configs.cos_fac,
+                       self.field_configs.weight_fac]
+        return arrays
+
+    def init_buffer(self):
+        """Precompute offset table for walker buffer.
+
+        The buffer is a contiguous byte array. Each array in buffer_arrays
+        occupies a fixed (16 byte aligned) slice, followed by the walker's
+        weight, overlap sign and log, local energy and random number stream
+        label. Must be called after the walker's field configurations have
+        been set.
+        """
+        self.buffer_layout = []
+        offset = 0
+        for a in self.buffer_arrays():
+            self.buffer_layout.append((offset, a.nbytes, a.dtype, a.shape))
+            offset += -(-a.nbytes//16) * 16
+        # weight, overlap sign and log, local energy and stream label.
+        self.scalar_dtype = numpy.dtype(self.phi.dtype)
+        nbytes = 5 * self.scalar_dtype.itemsize
+        self.buffer_layout.append((offset, nbytes, self.scalar_dtype, (5,)))
+        self.buffer_size = offset + nbytes
+
+    def get_buffer(self, buff=None):
         """Get walker buffer for MPI communication
 
+        Parameters
+        ----------
+        buff : :class:`numpy.ndarray`, optional
+            Byte array of length buffer_size to pack walker into. If None a
+            new array is allocated.
+
         Returns
         -------
-        buff : dict
+        buff : :class:`numpy.ndarray`
             Relevant walker information for population control.
         """
-        buff = {
-            'phi': self.phi,
-            'phi_old': self.phi_old,
-            'phi_init': self.phi_init,
-            'phi_bp': self.phi_bp,
-            'weight': self.weight,
-            'inv_ovlp': self.inv_ovlp,
-            'G': self.G,
-            'overlap': self.ot,
-            'overlaps': self.ots,
-            'fields': self.field_configs.configs,
-            'cfacs': self.field_configs.cos_fac,
-            'E_L': self.E_L,
-            'weight_fac': self.field_configs.weight_fac
-        }
+        if buff is None:
+            buff = numpy.empty(self.buffer_size, dtype=numpy.uint8)
+        views = self.buffer_views(buff)
+        for (v, a) in zip(views, self.buffer_arrays()):
+            numpy.copyto(v, a)
+        views[-1][:] = [self.weight, self.ot_sign, self.log_ot, self.E_L,
+                        self.stream]
         return buff
 
     def set_buffer(self, buff):
         """Set walker buffer following MPI communication
 
+        Data is copied into the walker's existing arrays, which may be views of
+        a :class:`pauxy.walkers.stack.WalkerStack`.
+
         Parameters
         -------
-        buff : dict
+        buff : :class:`numpy.ndarray`
             Relevant walker information for population control.
         """
-        self.phi = numpy.copy(buff['phi'])
-        self.phi_old = numpy.copy(buff['phi_old'])
-        self.phi_init = numpy.copy(buff['phi_init'])
-        self.phi_bp = numpy.copy(buff['phi_bp'])
-        self.inv_ovlp = numpy.copy(buff['inv_ovlp'])
-        self.G = numpy.copy(buff['G'])
-        self.weight = buff['weight']
-        self.ot = buff['overlap']
-        self.E_L = buff['E_L']
-        self.ots = numpy.copy(buff['overlaps'])
-        self.field_configs.configs = numpy.copy(buff['fields'])
-        self.field_configs.cos_fac = numpy.copy(buff['cfacs'])
-        self.field_configs.weight_fac = numpy.copy(buff['weight_fac'])
+        views = self.buffer_views(buff)
+        for (v, a) in zip(views, self.buffer_arrays()):
+            numpy.copyto(a, v)
+        (self.weight, self.ot_sign, self.log_ot, self.E_L,
+         stream) = views[-1]
+        self.weight = self.weight.real
+        self.log_ot = self.log_ot.real
+        self.E_L = self.E_L.real
+        self.stream = int(stream.real)
+
+    def buffer_views(self, buff):
+        """Construct views of walker's data within buffer.
+
+        Parameters
+        ----------
+        buff : :class:`numpy.ndarray`
+            Walker buffer.
+
+        Returns
+        -------
+        views : list of :class:`numpy.ndarray`
+            Views into buff with walker's array shapes and types.
+        """
+        return [buff[o:o+n].view(dtype).reshape(shape)
+                for (o, n, dtype, shape) in self.buffer_layout]
+
+
+def initial_wavefunction(system, trial):
+    """Wavefunction walkers are initialised to.
+
+    Parameters
+    ----------
+    system : object
+        System object.
+    trial : object
+        Trial wavefunction object.
+
+    Returns
+    -------
+    psi : :class:`numpy.ndarray`
+        Free electron wavefunction if trial.initial_wavefunction is
+        'free_electron', otherwise the trial wavefunction.
+    """
+    if trial.initial_wavefunction == 'free_electron':
+        tmp = FreeElectron(system, system.ktwist.ndim > 0, {})
+        return tmp.psi
+    else:
+        return trial.psi
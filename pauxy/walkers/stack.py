@@ -0,0 +1,63 @@
+import numpy
+
+
+class WalkerStack(object):
+    """Contiguous storage for a population of single determinant walkers.
+
+    Each walker's Slater determinant, Green's functions and historic
+    wavefunctions are stored as a slice of a single array whose leading
+    dimension is the walker index, so that operations can be applied to the
+    whole population at once. Individual walkers hold views into these arrays.
+
+    Parameters
+    ----------
+    system : object
+        System object.
+    dtype : type
+        Data type of walker's wavefunction.
+    nwalkers : int
+        Number of walkers to allocate storage for.
+    history : bool
+        If true allocate historic wavefunctions required by back propagation
+        and ITCF estimators.
+
+    Attributes
+    ----------
+    phi : :class:`numpy.ndarray`
+        Walker Slater determinants. Shape (nwalkers, nbasis, ne).
+    phi_old : :class:`numpy.ndarray` or None
+        Historic wavefunctions for back propagation.
+    phi_init : :class:`numpy.ndarray` or None
+        Historic wavefunctions for ITCF.
+    phi_bp : :class:`numpy.ndarray` or None
+        Back propagated wavefunctions.
+    inv_ovlp : list of :class:`numpy.ndarray`
+        Inverse overlap matrices for up and down spin sectors. Shapes
+        (nwalkers, nup, nup) and (nwalkers, ndown, ndown).
+    G : :class:`numpy.ndarray`
+        Walker Green's functions. Shape (nwalkers, 2, nbasis, nbasis).
+    Gmod : :class:`numpy.ndarray`
+        Half rotated Green's functions. Shape (nwalkers, 2, nbasis, nup).
+    """
+
+    def __init__(self, system, dtype, nwalkers, history=True):
+        nbasis = system.nbasis
+        self.nwalkers = nwalkers
+        self.phi = numpy.zeros(shape=(nwalkers, nbasis, system.ne),
+                               dtype=dtype)
+        if history:
+            self.phi_old = numpy.zeros(shape=self.phi.shape, dtype=dtype)
+            self.phi_init = numpy.zeros(shape=self.phi.shape, dtype=dtype)
+            self.phi_bp = numpy.zeros(shape=self.phi.shape, dtype=dtype)
+        else:
+            self.phi_old = None
+            self.phi_init = None
+            self.phi_bp = None
+        self.inv_ovlp = [
+            numpy.zeros(shape=(nwalkers, system.nup, system.nup), dtype=dtype),
+            numpy.zeros(shape=(nwalkers, system.ndown, system.ndown),
+                        dtype=dtype)
+        ]
+        self.G = numpy.zeros(shape=(nwalkers, 2, nbasis, nbasis), dtype=dtype)
+        self.Gmod = numpy.zeros(shape=(nwalkers, 2, nbasis, system.nup),
+                                dtype=dtype)